@@ -0,0 +1,44 @@
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass
+
+# Shorter page bodies are saved as text, compressed data of short text is
+# not much smaller.
+COMPRESS_MIN_LENGTH = 128
+
+
+@dataclass
+class BodyCodec:
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+def zstd_codec() -> BodyCodec:
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+
+        return BodyCodec(zstd.compress, zstd.decompress)
+    except ImportError:
+        pass
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        return BodyCodec(zstandard.compress, zstandard.decompress)
+    except ImportError as e:
+        raise ImportError(
+            "Install the zstandard package to use zstd page body compression"
+        ) from e
+
+
+# Keys are codec names saved in the database, add new items to support
+# other compression formats
+BODY_CODECS: dict[str, Callable[[], BodyCodec]] = {
+    "zlib": lambda: BodyCodec(zlib.compress, zlib.decompress),
+    "zstd": zstd_codec,
+}
+
+
+def get_body_codec(name: str) -> BodyCodec:
+    if name not in BODY_CODECS:
+        raise ValueError(f"Page body compression {name} is not supported")
+    return BODY_CODECS[name]()
@@ -12,13 +12,14 @@ import tempfile
 import urllib.parse
 from collections import defaultdict, deque
 from collections.abc import Callable, Sequence, Set
-from dataclasses import dataclass
-from functools import lru_cache
+from contextlib import contextmanager
+from dataclasses import asdict, astuple, dataclass, replace
 from importlib.resources import files
 from pathlib import Path
 from types import TracebackType
 from typing import (
     TYPE_CHECKING,
+    Any,
     Iterator,
     Optional,
     TypedDict,
@@ -27,6 +28,7 @@ from typing import (
 
 from requests import Session
 
+from .body_codec import COMPRESS_MIN_LENGTH, BodyCodec, get_body_codec
 from .common import (
     MAGIC_FIRST,
     MAGIC_LBRACKET_CHAR,
@@ -41,6 +43,18 @@ from .common import (
 from .logging_utils import logger
 from .luaexec import call_lua_sandbox
 from .node_expand import NodeHandlerFnCallable, to_html, to_text, to_wikitext
+from .page_cache import PAGE_CACHE_BYTES, TEMPLATE_CACHE_BYTES, PageCache
+from .pagestore import (
+    OPTIMIZED_PAGE_SIZE,
+    PAGE_STORES,
+    PageRow,
+    PageStore,
+    PreloadPageStore,
+    RedirectTargetRows,
+    SavePageRow,
+    page_pack_path,
+    write_page_pack,
+)
 from .parser import (
     KIND_TO_LEVEL,
     GeneralNode,
@@ -50,6 +64,8 @@ from .parser import (
     set_inside_html_tags_re,
 )
 from .parserfns import PARSER_FUNCTIONS, call_parser_function
+from .template_catalog import CatalogEntry, TemplateCatalog
+from .title_filter import TitleFilter
 from .wikihtml import ALLOWED_HTML_TAGS, HTMLTagData
 
 if TYPE_CHECKING:
@@ -126,6 +142,52 @@ class Page:
     need_pre_expand: bool = False
     body: Optional[str] = None
     model: Optional[str] = None
+    page_id: Optional[int] = None
+
+
+class LazyPage(Page):
+    """Page returned by `Wtp.get_all_pages(body="lazy")`, the body is read
+    from the database when the `body` attribute is first used."""
+
+    loaded_body: Optional[str]
+
+    def __init__(self, wtp: "Wtp", **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # set to `None` by `Page.__init__()`
+        del self.loaded_body
+        self.wtp = wtp
+
+    @property
+    def body(self) -> Optional[str]:
+        if "loaded_body" not in self.__dict__:
+            self.loaded_body = self.wtp.get_saved_page_body(
+                self.title, self.namespace_id
+            )
+        return self.loaded_body
+
+    @body.setter
+    def body(self, body: Optional[str]) -> None:
+        self.loaded_body = body
+
+    def __reduce__(self) -> tuple:
+        # pickled as `Page`, the `Wtp` object can't be pickled
+        return Page, astuple(self)
+
+
+@dataclass
+class SiteStats:
+    """Page counts of the NUMBEROFPAGES and NUMBEROFARTICLES magic words,
+    articles are pages in the main namespace that are not redirects."""
+
+    pages: int = 0
+    articles: int = 0
+
+    def add_page(
+        self, namespace_id: Optional[int], redirect_to: Optional[str], count=1
+    ) -> None:
+        self.pages += count
+        if namespace_id == 0 and redirect_to is None:
+            self.articles += count
 
 
 class BegLineDisableManager:
@@ -229,6 +291,15 @@ ALL_BRACKETS_RE = re.compile(
 )
 
 
+# Columns in the order of `SavePageRow`
+PAGES_COLUMNS = """title, namespace_id, body, redirect_to, need_pre_expand,
+model, revision_id, sha1, page_id, title_key"""
+TEMPLATE_INCLUDES_COLUMNS = "template, used_template"
+
+# Namespaces of pages used when expanding other pages
+HOT_NAMESPACES = ("Template", "Module", "MediaWiki")
+
+
 class Wtp:
     """Context used for processing wikitext and for expanding templates,
     parser functions and Lua macros.  The intended usage pattern is to
@@ -283,6 +354,26 @@ class Wtp:
         "wiki_notices",  # WIKI error messages
         "wikidata_session",
         "linktrailing_re",
+        "bulk_load_rows",  # Pages not yet saved in bulk load mode or None
+        "bulk_load_batch_size",
+        "bulk_load_skip_unchanged",  # Compare SHA-1 of pages in bulk load
+        "body_compression",  # Page body compression codec name or None
+        "body_codec",
+        "read_only",  # Database is opened read-only
+        "page_cache",  # `get_page()` query results
+        "title_filter",  # Bloom filter of saved title keys or None
+        "title_filter_saved",  # The filter is saved in the database
+        "page_store_backend",  # Name of the `PageStore` class
+        "page_store",
+        "preload_namespaces",  # Namespaces loaded to memory
+        "search_index",  # Create full-text index for `search_pattern`
+        "site_stats",  # Saved `SiteStats` or None if not yet counted
+        "site_stats_saved",  # The statistics are saved in the database
+        "backup_overwritten",  # Save original rows of changed pages
+        "redirects_resolved",  # Saved redirect targets are up to date
+        "template_namespace_id",
+        "template_catalog",  # Data of template and module pages
+        "template_catalog_saved",  # The catalog is saved in the database
     )
 
     def __init__(
@@ -294,6 +385,13 @@ class Wtp:
         extension_tags: Optional[dict[str, HTMLTagData]] = None,
         parser_function_aliases: dict[str, str] = {},
         quiet: bool = False,
+        body_compression: Optional[str] = None,
+        read_only: bool = False,
+        template_cache_bytes: int = TEMPLATE_CACHE_BYTES,
+        page_cache_bytes: int = PAGE_CACHE_BYTES,
+        page_store_backend: Optional[str] = None,
+        preload_namespaces: Sequence[str] = (),
+        search_index: bool = False,
     ):
         if isinstance(db_path, str):
             self.db_path: Optional[Path] = Path(db_path)
@@ -322,6 +420,41 @@ class Wtp:
         self.lang_code = lang_code  # dump file language code
         self.data_folder = files("wikitextprocessor") / "data" / lang_code
         self.init_namespace_data()
+        self.page_cache = PageCache(
+            {
+                self.NAMESPACE_DATA[ns_name]["id"]
+                for ns_name in ("Template", "Module")
+                if ns_name in self.NAMESPACE_DATA
+            },
+            template_cache_bytes,
+            page_cache_bytes,
+        )
+        # "zlib" or "zstd", the codec saved in an existing database is used
+        self.body_compression = body_compression
+        self.body_codec: Optional[BodyCodec] = None
+        # open an existing database read-only, used by worker processes,
+        # the page pack file can't be changed
+        self.read_only = read_only or page_store_backend == "pack"
+        # "sqlite", "memory", "mmap" or "pack", read-only database uses "mmap"
+        if page_store_backend is None:
+            page_store_backend = "mmap" if read_only else "sqlite"
+        if page_store_backend not in PAGE_STORES:
+            raise ValueError(
+                f"Page store {page_store_backend} is not supported"
+            )
+        self.page_store_backend = page_store_backend
+        # names in "namespaces.json", e.g. `HOT_NAMESPACES`
+        self.preload_namespaces = preload_namespaces
+        # an existing index is always used and updated
+        self.search_index = search_index
+        self.title_filter: Optional[TitleFilter] = None
+        self.title_filter_saved = False
+        self.site_stats: Optional[SiteStats] = None
+        self.site_stats_saved = False
+        self.backup_overwritten = False
+        self.redirects_resolved = False
+        self.template_catalog = TemplateCatalog(())
+        self.template_catalog_saved = False
         self.create_db()
         self.template_override_funcs = template_override_funcs
         self.beginning_of_line = False
@@ -364,10 +497,17 @@ class Wtp:
         # causes problems in them.
         # Will be modified later in wiktextract wxr through WiktionaryConfig.
         self.linktrailing_re = re.compile(r"(?s)(\w+)(.*)")
+        self.bulk_load_rows: Optional[list[tuple]] = None
+        self.bulk_load_batch_size = 10000
+        self.bulk_load_skip_unchanged = False
 
     def create_db(self) -> None:
         from .wikidata import init_wikidata_cache
 
+        if self.read_only:
+            self.open_read_only_db()
+            return
+
         if self.db_path is None:
             temp_file = tempfile.NamedTemporaryFile(
                 prefix="wikitextprocessor_tempdb", delete=False
@@ -389,18 +529,536 @@ class Wtp:
         need_pre_expand INTEGER,
         body TEXT,
         model TEXT,
+        revision_id INTEGER,
+        sha1 TEXT,
+        page_id INTEGER,
+        title_key TEXT,
+        redirect_key TEXT,
+        redirect_namespace_id INTEGER,
         PRIMARY KEY(title, namespace_id));
 
+        CREATE TABLE IF NOT EXISTS template_includes (
+        template TEXT,
+        used_template TEXT,
+        PRIMARY KEY(used_template, template)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS template_includes_template
+        ON template_includes(template);
+
+        CREATE TABLE IF NOT EXISTS metadata (
+        name TEXT PRIMARY KEY,
+        value);
+
         PRAGMA journal_mode = WAL;
         """
         )
+        self.add_missing_page_columns()
+        self.db_conn.execute(
+            "CREATE INDEX IF NOT EXISTS pages_page_id ON pages(page_id)"
+        )
+        self.db_conn.execute(
+            """CREATE INDEX IF NOT EXISTS pages_title_key
+            ON pages(title_key, namespace_id)"""
+        )
+        self.init_body_codec()
+        self.init_page_store()
+        self.load_title_filter()
+        self.load_site_stats()
+        self.load_redirects_resolved()
+        self.restore_overwritten_pages()
+        self.load_template_catalog()
         init_wikidata_cache(self)
 
+    def open_read_only_db(self) -> None:
+        """Open the database file created by another `Wtp` object without
+        locking or writing to it, processes reading the same file share
+        the memory-mapped pages."""
+        if self.db_path is None or not self.db_path.exists():
+            raise ValueError(f"Database file {self.db_path} doesn't exist")
+        uri = self.db_path.resolve().as_uri() + "?mode=ro"
+        if not self.db_path.with_name(self.db_path.name + "-wal").exists():
+            # no uncommitted WAL data, the file is not changed by others
+            uri += "&immutable=1"
+        self.db_conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.db_conn.execute("PRAGMA query_only = ON")
+        self.init_body_codec()
+        self.init_page_store()
+        self.load_title_filter()
+        self.load_site_stats()
+        self.load_redirects_resolved()
+        self.load_template_catalog()
+
+    def init_body_codec(self) -> None:
+        result = self.db_conn.execute(
+            "SELECT value FROM metadata WHERE name = 'body_compression'"
+        ).fetchone()
+        if result is not None:
+            if self.body_compression not in (None, result[0]):
+                logger.warning(
+                    f"Page bodies in {self.db_path} are compressed with "
+                    f"{result[0]}, {self.body_compression} is not used"
+                )
+            self.body_compression = result[0]
+        elif self.body_compression is not None and not self.read_only:
+            self.db_conn.execute(
+                "INSERT INTO metadata VALUES('body_compression', ?)",
+                (self.body_compression,),
+            )
+            self.db_conn.commit()
+
+        if self.body_compression is not None:
+            self.body_codec = get_body_codec(self.body_compression)
+
+    def init_page_store(self) -> None:
+        self.page_store: PageStore = PAGE_STORES[self.page_store_backend](
+            self.db_conn,
+            self.decompress_body if self.body_codec is not None else None,
+            self.db_path,
+        )
+        if self.search_index and not self.read_only:
+            self.page_store.create_search_index()
+        if len(self.preload_namespaces) > 0:
+            self.page_store = PreloadPageStore(
+                self.page_store,
+                {
+                    self.NAMESPACE_DATA[ns_name]["id"]
+                    for ns_name in self.preload_namespaces
+                },
+                self._title_key,
+            )
+
+    def load_title_filter(self) -> None:
+        result = self.db_conn.execute(
+            "SELECT value FROM metadata WHERE name = 'title_filter'"
+        ).fetchone()
+        if result is not None:
+            self.title_filter = TitleFilter.from_bytes(result[0])
+            self.title_filter_saved = self.title_filter is not None
+
+    def build_title_filter(self) -> None:
+        """Create the Bloom filter of saved page titles used to skip
+        database queries of pages not exist, called after pages are
+        saved from dump file."""
+        logger.info("Building title filter")
+        self.title_filter = TitleFilter.build(
+            self.page_store.count_pages(), self.page_store.iter_title_keys()
+        )
+        self.title_filter_saved = False
+        self.page_cache.clear()
+        self.save_title_filter()
+
+    def save_title_filter(self) -> None:
+        """Save the filter if it has titles added after it's loaded, or
+        build the filter if the database doesn't have it."""
+        if self.title_filter is None:
+            self.build_title_filter()
+        elif not self.title_filter_saved and not self.read_only:
+            self.db_conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES('title_filter', ?)",
+                (self.title_filter.to_bytes(),),
+            )
+            self.db_conn.commit()
+            self.title_filter_saved = True
+
+    def load_redirects_resolved(self) -> None:
+        self.redirects_resolved = (
+            self.db_conn.execute(
+                "SELECT value FROM metadata WHERE name = 'redirects_resolved'"
+            ).fetchone()
+            is not None
+        )
+
+    def resolve_redirects(self) -> None:
+        """Save the last page of the redirect chain of each redirect page,
+        `get_page_resolve_redirect()` then finds the redirect page and the
+        target page with one query. Called after bulk load."""
+        logger.info("Resolving redirects")
+        self.redirects_resolved = False
+        self.page_cache.clear()
+        targets = []
+        for row in self.page_store.iter_pages(include_body=False):
+            if row[2] is None:
+                continue
+            target = self.follow_redirects(self.page_from_row(row))
+            if target is not None:
+                targets.append(
+                    (
+                        self._title_key(target.title, target.namespace_id),
+                        target.namespace_id,
+                        row[0],
+                        row[1],
+                    )
+                )
+        self.page_store.save_redirect_targets(targets)
+        self.page_cache.clear()
+        self.redirects_resolved = True
+        if not self.read_only:
+            self.db_conn.execute(
+                """INSERT OR REPLACE INTO metadata
+                VALUES('redirects_resolved', 1)"""
+            )
+            self.db_conn.commit()
+        logger.info(f"Resolved {len(targets)} redirects")
+
+    def check_redirect_changes(
+        self,
+        old_redirect_to: list[Optional[str]],
+        new_redirect_to: Optional[str] = None,
+    ) -> None:
+        """Saved redirect targets are not used after a redirect page is
+        changed or added because the page could be in the middle of other
+        redirect chains, they are saved again by `resolve_redirects()`."""
+        if self.redirects_resolved and (
+            new_redirect_to is not None
+            or any(redirect_to is not None for redirect_to in old_redirect_to)
+        ):
+            self.redirects_resolved = False
+            self.page_cache.redirect_targets.clear()
+            self.db_conn.execute(
+                "DELETE FROM metadata WHERE name = 'redirects_resolved'"
+            )
+
+    def load_template_catalog(self) -> None:
+        result = self.db_conn.execute(
+            "SELECT value FROM metadata WHERE name = 'template_catalog'"
+        ).fetchone()
+        if result is None:
+            self.build_template_catalog()
+        else:
+            self.template_catalog = TemplateCatalog.from_bytes(result[0])
+            self.template_catalog_saved = True
+
+    def build_template_catalog(self) -> None:
+        """Read template and module pages to create the catalog, called if
+        the catalog is not saved and after bulk load."""
+        namespace_ids = [
+            self.NAMESPACE_DATA[ns_name]["id"]
+            for ns_name in ("Template", "Module")
+            if ns_name in self.NAMESPACE_DATA
+        ]
+        catalog = TemplateCatalog(namespace_ids)
+        for row in self.page_store.iter_pages(namespace_ids):
+            catalog.add_page(
+                row[0],
+                row[1],
+                row[2],
+                row[3] == 1,
+                self.decompress_body(row[4]),
+            )
+        self.template_catalog = catalog
+        self.template_catalog_saved = False
+        self.save_template_catalog()
+
+    def save_template_catalog(self) -> None:
+        if not self.read_only and not self.template_catalog_saved:
+            self.db_conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES('template_catalog', ?)",
+                (self.template_catalog.to_bytes(),),
+            )
+            self.template_catalog_saved = True
+
+    def template_catalog_changed(self) -> None:
+        # the catalog is saved again when the database is closed
+        if self.template_catalog_saved:
+            self.db_conn.execute(
+                "DELETE FROM metadata WHERE name = 'template_catalog'"
+            )
+            self.template_catalog_saved = False
+
+    def get_catalog_entry(
+        self, title: str, namespace_id: int
+    ) -> Optional[CatalogEntry]:
+        normalized_title = self.normalize_title(title, namespace_id)
+        if normalized_title is None:
+            return None
+        return self.template_catalog.get(normalized_title, namespace_id)
+
+    def get_page_size(self, title: str) -> Optional[int]:
+        """Return the length of the UTF-8 encoded body of the page or the
+        redirect target page, `title` has namespace prefix."""
+        for namespace_id in self.template_catalog.namespace_ids:
+            if title.startswith(self.LOCAL_NS_NAME_BY_ID[namespace_id] + ":"):
+                entry = self.get_catalog_entry(title, namespace_id)
+                if entry is not None and entry.redirect_to is None:
+                    return entry.body_length
+                break
+        body = self.get_page_body(title, None)
+        return None if body is None else len(body.encode())
+
+    def load_site_stats(self) -> None:
+        result = self.db_conn.execute(
+            "SELECT value FROM metadata WHERE name = 'site_stats'"
+        ).fetchone()
+        if result is not None:
+            self.site_stats = SiteStats(**json.loads(result[0]))
+            self.site_stats_saved = True
+
+    def build_site_stats(self) -> SiteStats:
+        """Count pages and save the result, called after pages are saved
+        from dump file and the first time the statistics are used if they
+        are not saved."""
+        self.site_stats = SiteStats(
+            self.page_store.count_pages(),
+            self.page_store.count_pages([0], False),
+        )
+        self.site_stats_saved = False
+        self.save_site_stats()
+        return self.site_stats
+
+    def save_site_stats(self) -> None:
+        """Save the statistics updated by `add_page()` and `delete_page()`,
+        or count pages if the statistics are not saved."""
+        if self.site_stats is None:
+            self.build_site_stats()
+        elif not self.site_stats_saved and not self.read_only:
+            self.db_conn.execute(
+                "INSERT OR REPLACE INTO metadata VALUES('site_stats', ?)",
+                (json.dumps(asdict(self.site_stats)),),
+            )
+            self.site_stats_saved = True
+
+    def get_site_stats(self) -> SiteStats:
+        if self.site_stats is None:
+            return self.build_site_stats()
+        return self.site_stats
+
+    def saved_redirect_to(
+        self, title: str, namespace_id: Optional[int]
+    ) -> list[Optional[str]]:
+        """Return the `redirect_to` value of the saved page if the
+        statistics or redirect targets need to be updated when the page is
+        changed."""
+        if (
+            self.site_stats is None and not self.redirects_resolved
+        ) or namespace_id is None:
+            return []
+        return self.page_store.get_redirect_to(title, namespace_id)
+
+    def update_site_stats(
+        self,
+        namespace_id: Optional[int],
+        old_redirect_to: list[Optional[str]],
+        new_row: Optional[SavePageRow] = None,
+    ) -> None:
+        if self.site_stats is None:
+            return
+        for redirect_to in old_redirect_to:
+            self.site_stats.add_page(namespace_id, redirect_to, -1)
+        if new_row is not None:
+            self.site_stats.add_page(namespace_id, new_row[3])
+        if self.site_stats_saved:
+            # removed in the same transaction as the page, the statistics
+            # are saved again in `save_site_stats()`
+            self.db_conn.execute(
+                "DELETE FROM metadata WHERE name = 'site_stats'"
+            )
+            self.site_stats_saved = False
+
+    def compress_body(self, body: Optional[str]) -> Optional[Union[str, bytes]]:
+        if (
+            self.body_codec is None
+            or body is None
+            or len(body) < COMPRESS_MIN_LENGTH
+        ):
+            return body
+        return self.body_codec.compress(body.encode("utf-8"))
+
+    def decompress_body(
+        self, body: Optional[Union[str, bytes]]
+    ) -> Optional[str]:
+        # short bodies and bodies saved before enabling compression are text
+        if isinstance(body, bytes):
+            assert self.body_codec is not None
+            return self.body_codec.decompress(body).decode("utf-8")
+        return body
+
+    def add_missing_page_columns(self) -> None:
+        # Add columns to database files created by older versions
+        columns = {
+            column[1]
+            for column in self.db_conn.execute("PRAGMA table_info(pages)")
+        }
+        for column, column_type in (
+            ("revision_id", "INTEGER"),
+            ("sha1", "TEXT"),
+            ("page_id", "INTEGER"),
+            ("title_key", "TEXT"),
+            # title key of the last page in the redirect chain
+            ("redirect_key", "TEXT"),
+            ("redirect_namespace_id", "INTEGER"),
+        ):
+            if column not in columns:
+                self.db_conn.execute(
+                    f"ALTER TABLE pages ADD COLUMN {column} {column_type}"
+                )
+        if "title_key" not in columns:
+            self.db_conn.executemany(
+                "UPDATE pages SET title_key = ? WHERE rowid = ?",
+                (
+                    (self._title_key(title, namespace_id), rowid)
+                    for rowid, title, namespace_id in self.db_conn.execute(
+                        "SELECT rowid, title, namespace_id FROM pages"
+                    ).fetchall()
+                ),
+            )
+            self.db_conn.commit()
+
     @property
     def backup_db_path(self) -> Path:
         assert self.db_path
         return self.db_path.with_stem(self.db_path.stem + "_backup")
 
+    @property
+    def page_pack_path(self) -> Path:
+        assert self.db_path
+        return page_pack_path(self.db_path)
+
+    def export_page_pack(self) -> Path:
+        """Save all pages to a file next to the database file, the file is
+        read by `Wtp` objects created with `page_store_backend="pack"`.
+        Used after all pages are saved and templates are analyzed, worker
+        processes then share the memory-mapped file."""
+        logger.info(f"Exporting pages to {self.page_pack_path}")
+        page_num, file_size = write_page_pack(
+            self.page_pack_path,
+            (
+                (
+                    self._title_key(row[0], row[1]),
+                    row[:4] + (self.decompress_body(row[4]),) + row[5:],
+                )
+                for row in self.page_store.iter_pages()
+            ),
+        )
+        logger.info(f"Exported {page_num} pages, {file_size} bytes")
+        return self.page_pack_path
+
+    def backup_overwritten_pages(self) -> None:
+        """Save the original rows of pages changed after this call, used
+        before overwriting pages of an existing database. The pages and
+        analyzed template data are restored the next time the database is
+        opened. Unlike `backup_db()`, only changed rows are copied."""
+        if self.has_table("overwritten_pages"):
+            self.backup_overwritten = True
+            return
+        self.db_conn.executescript(
+            f"""
+        CREATE TABLE overwritten_pages (
+        title TEXT,
+        namespace_id INTEGER,
+        body TEXT,
+        redirect_to TEXT,
+        need_pre_expand INTEGER,
+        model TEXT,
+        revision_id INTEGER,
+        sha1 TEXT,
+        page_id INTEGER,
+        title_key TEXT,
+        new_page INTEGER,
+        PRIMARY KEY(title, namespace_id));
+
+        CREATE TABLE overwritten_need_pre_expand AS
+        SELECT title, namespace_id FROM pages WHERE need_pre_expand = 1;
+
+        CREATE TABLE overwritten_template_includes AS
+        SELECT {TEMPLATE_INCLUDES_COLUMNS} FROM template_includes;
+        """
+        )
+        self.db_conn.commit()
+        self.backup_overwritten = True
+
+    def save_original_page(
+        self, title: str, namespace_id: Optional[int]
+    ) -> None:
+        """Copy the saved row of the page to the `overwritten_pages` table
+        if the row is not copied before."""
+        if not self.backup_overwritten:
+            return
+        self.db_conn.execute(
+            f"""INSERT OR IGNORE INTO overwritten_pages
+            SELECT {PAGES_COLUMNS}, 0 FROM pages
+            WHERE title = ? AND namespace_id = ?""",
+            (title, namespace_id),
+        )
+        # the page is removed when restored if it is not saved
+        self.db_conn.execute(
+            """INSERT OR IGNORE INTO overwritten_pages
+            (title, namespace_id, new_page) VALUES(?, ?, 1)""",
+            (title, namespace_id),
+        )
+
+    def restore_overwritten_pages(self) -> None:
+        if not self.has_table("overwritten_pages"):
+            return
+        logger.info("Restoring overwritten pages")
+        for row in self.db_conn.execute(
+            f"SELECT {PAGES_COLUMNS}, new_page FROM overwritten_pages"
+        ).fetchall():
+            title, namespace_id = row[:2]
+            old_redirect_to = self.saved_redirect_to(title, namespace_id)
+            if row[-1] == 1:
+                self.page_store.delete_page(title, namespace_id)
+                self.update_site_stats(namespace_id, old_redirect_to)
+                self.check_redirect_changes(old_redirect_to)
+            else:
+                self.page_store.save_page(row[:-1])
+                self.update_site_stats(namespace_id, old_redirect_to, row[:-1])
+                self.check_redirect_changes(old_redirect_to, row[3])
+
+        need_pre_expand = defaultdict(set)
+        for title, namespace_id in self.db_conn.execute(
+            "SELECT title, namespace_id FROM overwritten_need_pre_expand"
+        ):
+            need_pre_expand[namespace_id].add(title)
+        for (namespace_id,) in self.db_conn.execute(
+            "SELECT DISTINCT namespace_id FROM pages WHERE need_pre_expand = 1"
+        ).fetchall():
+            need_pre_expand.setdefault(namespace_id, set())
+        for namespace_id, titles in need_pre_expand.items():
+            current_titles = set(
+                self.page_store.need_pre_expand_titles(namespace_id)
+            )
+            self.page_store.clear_need_pre_expand(
+                current_titles - titles, namespace_id
+            )
+            for title in titles - current_titles:
+                self.page_store.set_need_pre_expand(title)
+
+        self.db_conn.executescript(
+            f"""
+        DELETE FROM template_includes;
+        INSERT INTO template_includes
+        SELECT {TEMPLATE_INCLUDES_COLUMNS} FROM overwritten_template_includes;
+        DROP TABLE overwritten_pages;
+        DROP TABLE overwritten_need_pre_expand;
+        DROP TABLE overwritten_template_includes;
+        DELETE FROM metadata WHERE name = 'template_catalog';
+        """
+        )
+        self.db_conn.commit()
+        self.page_cache.clear()
+
+    def has_table(self, name: str) -> bool:
+        for (result,) in self.db_conn.execute(
+            """SELECT EXISTS (SELECT 1 FROM sqlite_schema
+            WHERE type = 'table' AND name = ?)""",
+            (name,),
+        ):
+            return result == 1
+        return False
+
+    def optimize_db(self, page_size: int = OPTIMIZED_PAGE_SIZE) -> None:
+        """Reorganize the database file after pages are saved and templates
+        are analyzed: pages are sorted by namespace and title, the file is
+        rebuilt with a larger page size, table statistics used by the query
+        planner are collected and the WAL file is truncated."""
+        if self.read_only:
+            raise ValueError("Can't optimize read-only database")
+        logger.info("Optimizing database")
+        self.page_store.optimize(page_size)
+        self.db_conn.execute("ANALYZE")
+        self.db_conn.commit()
+        self.db_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.page_cache.clear()
+
     def backup_db(self) -> None:
         self.backup_db_path.unlink(True)
         self.db_conn.commit()
@@ -409,52 +1067,66 @@ class Wtp:
             self.db_conn.backup(backup_conn)
         backup_conn.close()
 
+    @contextmanager
+    def bulk_load(
+        self, batch_size: int = 10000, resumable: bool = False
+    ) -> Iterator[None]:
+        """Save pages added inside the `with` block faster, used when
+        extracting dump file. The SQLite page store inserts pages in batches
+        to a table without index and journal, then copies them to the
+        `pages` table sorted by primary key at the end of the block.
+
+        Pages added in the block can't be read until the block ends, and
+        the database file could be corrupted if the process crashes. If
+        `resumable` is `True`, the journal is kept and committed rows of an
+        interrupted bulk load are copied at the end of the next one."""
+        self.db_conn.commit()
+        # only look up saved pages if the database is not empty
+        self.bulk_load_skip_unchanged = self.has_pages()
+        self.bulk_load_rows = []
+        self.bulk_load_batch_size = batch_size
+        try:
+            with self.page_store.bulk_load(resumable):
+                yield
+                self.save_bulk_load_rows()
+            self.build_title_filter()
+            self.build_site_stats()
+            self.db_conn.commit()
+            self.resolve_redirects()
+            self.build_template_catalog()
+        finally:
+            self.bulk_load_rows = None
+            self.page_cache.clear()
+
+    def save_bulk_load_rows(self) -> None:
+        if self.bulk_load_rows:
+            self.page_store.save_bulk_load_pages(self.bulk_load_rows)
+            self.bulk_load_rows.clear()
+
     def close_db_conn(self) -> None:
         assert self.db_path
+        self.save_template_catalog()
+        if self.title_filter is not None:
+            self.save_title_filter()
+        if self.site_stats is not None:
+            self.save_site_stats()
+        self.page_store.close()
         self.db_conn.commit()
         self.db_conn.close()
-        if self.db_path.parent.samefile(Path(tempfile.gettempdir())):
+        if not self.read_only and self.db_path.parent.samefile(
+            Path(tempfile.gettempdir())
+        ):
             for path in self.db_path.parent.glob(self.db_path.name + "*"):
                 # also remove SQLite -wal and -shm file
                 path.unlink(True)
         if self.wikidata_session is not None:
             self.wikidata_session.close()
 
-    def has_analyzed_templates(self) -> bool:
-        for (result,) in self.db_conn.execute(
-            "SELECT count(*) > 0 FROM pages WHERE need_pre_expand = 1"
-        ):
-            return result == 1
-        return False
-
-    def build_sql_where_query(
-        self,
-        namespace_ids: Optional[list[int]] = None,
-        include_redirects: bool = True,
-        model: Optional[str] = None,
-        search_pattern: Optional[str] = None,
-    ) -> tuple[str, tuple[Union[str, int], ...]]:
-        and_strs = []
-        where_str = ""
-        query_values: list[Union[int, str]] = []
-        if namespace_ids is not None:
-            and_strs.append(
-                f"namespace_id IN ({','.join('?' * len(namespace_ids))})"
-            )
-            query_values.extend(namespace_ids)
-        if not include_redirects:
-            and_strs.append("redirect_to IS NULL")
-        if search_pattern:
-            and_strs.append("body LIKE ?")
-            query_values.append(search_pattern)
-        if model is not None:
-            and_strs.append("model = ?")
-            query_values.append(model)
-
-        if len(and_strs) > 0:
-            where_str = " WHERE " + " AND ".join(and_strs)
+    def has_pages(self) -> bool:
+        return self.page_store.has_pages()
 
-        return where_str, tuple(query_values)
+    def has_analyzed_templates(self) -> bool:
+        return self.page_store.has_need_pre_expand_pages()
 
     def saved_page_nums(
         self,
@@ -463,22 +1135,10 @@ class Wtp:
         model: Optional[str] = None,
         search_pattern: Optional[str] = None,
     ) -> int:
-        query_str = "SELECT count(*) FROM pages"
-
-        where_str, query_values = self.build_sql_where_query(
-            namespace_ids,
-            include_redirects,
-            model,
-            search_pattern,
+        return self.page_store.count_pages(
+            namespace_ids, include_redirects, model, search_pattern
         )
 
-        query_str += where_str
-
-        for result in self.db_conn.execute(query_str, query_values):
-            return result[0]
-
-        return 0  # Mainly to satisfy the type checker
-
     def init_namespace_data(self) -> None:
         with self.data_folder.joinpath("namespaces.json").open(
             encoding="utf-8"
@@ -492,6 +1152,9 @@ class Wtp:
                 data["name"]: data["id"]
                 for data in self.NAMESPACE_DATA.values()
             }
+            self.template_namespace_id = self.NAMESPACE_DATA.get(
+                "Template", {"id": None}
+            ).get("id")
 
     def _fmt_errmsg(self, kind: str, msg: str, trace: Optional[str]) -> None:
         assert isinstance(kind, str)
@@ -958,11 +1621,80 @@ class Wtp:
         redirect_to: Optional[str] = None,
         need_pre_expand: bool = False,
         model: Optional[str] = "wikitext",
-    ) -> None:
+        revision_id: Optional[int] = None,
+        sha1: Optional[str] = None,
+        page_id: Optional[int] = None,
+    ) -> bool:
         """Collects information about the page and save page text to a
-        SQLite database file."""
+        SQLite database file. Pages are saved in batches in bulk load
+        mode.
+
+        `page_id` is the page id, `revision_id` and `sha1` are values of the
+        revision in dump file.
+        The page is not updated if the saved page has the same `sha1` value,
+        returns `False` in this case."""
         if model is None:
             model = "wikitext"
+        title = self._add_namespace_prefix(title, namespace_id)
+
+        if (
+            namespace_id
+            == self.NAMESPACE_DATA.get("Template", {"id": None}).get("id")
+            and redirect_to is None
+        ):
+            body = self._template_to_body(title, body)
+
+        row = (
+            title,
+            namespace_id,
+            self.compress_body(body),
+            redirect_to,
+            need_pre_expand,
+            model,
+            revision_id,
+            sha1,
+            page_id,
+            self._title_key(title, namespace_id),
+        )
+        if self.bulk_load_rows is not None:
+            if (
+                self.bulk_load_skip_unchanged
+                and sha1 is not None
+                and self.page_store.get_sha1(title, namespace_id) == sha1
+            ):
+                return False
+            self.bulk_load_rows.append(row)
+            if len(self.bulk_load_rows) >= self.bulk_load_batch_size:
+                self.save_bulk_load_rows()
+            return True
+
+        self.invalidate_page_cache(title, namespace_id)
+        if self.title_filter is not None:
+            self.title_filter.add(row[-1], namespace_id)
+            if self.title_filter_saved:
+                # the saved filter doesn't have the new title, it's removed
+                # in the same transaction as the page and saved again in
+                # `save_title_filter()`
+                self.db_conn.execute(
+                    "DELETE FROM metadata WHERE name = 'title_filter'"
+                )
+                self.title_filter_saved = False
+        old_redirect_to = self.saved_redirect_to(title, namespace_id)
+        self.save_original_page(title, namespace_id)
+        if not self.page_store.save_page(row):
+            return False
+        self.update_site_stats(namespace_id, old_redirect_to, row)
+        self.check_redirect_changes(old_redirect_to, redirect_to)
+        if namespace_id in self.template_catalog.namespace_ids:
+            self.template_catalog.add_page(
+                title, namespace_id, redirect_to, need_pre_expand, body
+            )
+            self.template_catalog_changed()
+        return True
+
+    def _add_namespace_prefix(
+        self, title: str, namespace_id: Optional[int]
+    ) -> str:
         if namespace_id:
             ns_prefix = self.LOCAL_NS_NAME_BY_ID.get(namespace_id, "") + ":"
         else:
@@ -972,31 +1704,77 @@ class Wtp:
 
         if title.startswith("Main:"):
             title = title[5:]
-
-        if (
-            namespace_id
-            == self.NAMESPACE_DATA.get("Template", {"id": None}).get("id")
-            and redirect_to is None
-        ):
-            body = self._template_to_body(title, body)
-
-        self.db_conn.execute(
-            """INSERT INTO pages (title, namespace_id, body,
-        redirect_to, need_pre_expand, model) VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(title, namespace_id) DO UPDATE SET
-        body=excluded.body, redirect_to=excluded.redirect_to,
-        need_pre_expand=excluded.need_pre_expand, model=excluded.model""",
-            (title, namespace_id, body, redirect_to, need_pre_expand, model),
+        return title
+
+    def _canonical_title(self, title: str, namespace_id: int) -> str:
+        """Replace namespace alias or lower case namespace prefix with the
+        local namespace name, add the prefix if the title doesn't have it."""
+        if namespace_id == 0:
+            return title
+        ns_prefix = self.LOCAL_NS_NAME_BY_ID[namespace_id] + ":"
+        if not title.startswith(ns_prefix):
+            if title.lower().startswith(self.namespace_prefixes(namespace_id)):
+                # replace lower case and alias prefix
+                title = ns_prefix + title[title.index(":") + 1 :]
+            else:
+                title = ns_prefix + title
+        return title
+
+    def _title_key(self, title: str, namespace_id: Optional[int]) -> str:
+        """Normalized title saved in the `title_key` column, pages are found
+        by this value and namespace id in `get_page()`."""
+        # " " in Lua Module name is replaced by "_" in Wiktionary Lua code
+        # when call `require`
+        title = title.replace("_", " ")
+        if not namespace_id:
+            return title
+        ns_prefix = self.LOCAL_NS_NAME_BY_ID.get(namespace_id, "") + ":"
+        if not title.startswith(ns_prefix):
+            return title
+        # page title is case-sensitive except the first character
+        # https://www.mediawiki.org/wiki/Manual:Page_title#Naming_restrictions
+        name = title[len(ns_prefix) :]
+        return ns_prefix + name[:1].upper() + name[1:]
+
+    def delete_page(self, title: str, namespace_id: int) -> None:
+        title = self._add_namespace_prefix(title, namespace_id)
+        old_redirect_to = self.saved_redirect_to(title, namespace_id)
+        self.save_original_page(title, namespace_id)
+        self.page_store.delete_page(title, namespace_id)
+        if len(old_redirect_to) > 0:
+            self.update_site_stats(namespace_id, old_redirect_to)
+            self.check_redirect_changes(old_redirect_to)
+        if namespace_id in self.template_catalog.namespace_ids:
+            self.template_catalog.remove_page(title, namespace_id)
+            self.template_catalog_changed()
+        self.invalidate_page_cache(title, namespace_id)
+
+    def invalidate_page_cache(
+        self, title: str, namespace_id: Optional[int]
+    ) -> None:
+        """Remove cached `get_page()` results of the changed page."""
+        self.page_cache.invalidate(
+            (self._title_key(title, namespace_id), namespace_id)
         )
+        # `get_page()` called without namespace id
+        self.page_cache.invalidate((self._title_key(title, None), None))
+        if namespace_id is not None:
+            self.page_cache.redirect_targets.pop((title, namespace_id), None)
 
     def analyze_templates(
         self,
         check_template_func: Callable[["Wtp", Page], tuple[set[str], bool]],
+        changed_titles: Optional[Set[str]] = None,
     ) -> None:
         """
         Analyzes templates to determine which of them might create elements
         essential to parsing Wikitext syntax, such as section heading nodes.
         Such templates generally need to be expanded before parsing the page.
+
+        If `changed_titles` is given, only these templates and the templates
+        that include them (directly or through other templates) are analyzed
+        again. This is used after some templates of an analyzed database
+        are updated or deleted.
         """
 
         logger.info(
@@ -1011,7 +1789,38 @@ class Wtp:
         # the namespace prefix
         included_map: defaultdict[str, set[str]] = defaultdict(set)
 
-        for page in self.get_all_pages([template_ns_id]):
+        analyze_titles: Optional[set[str]] = None
+        if changed_titles is not None:
+            for (has_includes,) in self.db_conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM template_includes)"
+            ):
+                if has_includes:
+                    analyze_titles = self.get_template_include_closure(
+                        changed_titles
+                    )
+        if analyze_titles is None:
+            self.db_conn.execute("DELETE FROM template_includes")
+            pages: Iterator[Page] = self.get_all_pages([template_ns_id])
+        else:
+            logger.info(f"Analyzing {len(analyze_titles)} changed templates")
+            # redirect pages are updated at the end
+            self.page_store.clear_redirect_need_pre_expand(template_ns_id)
+            self.page_store.clear_need_pre_expand(
+                analyze_titles, template_ns_id
+            )
+            self.db_conn.executemany(
+                "DELETE FROM template_includes WHERE template = ?",
+                ((title,) for title in analyze_titles),
+            )
+            self.page_cache.clear()
+            pages = (
+                page
+                for title in sorted(analyze_titles)
+                if (page := self.get_page(title, template_ns_id)) is not None
+                and page.title == title
+            )
+
+        for page in pages:
             used_templates, pre_expand = check_template_func(self, page)
             for used_template in used_templates:
                 included_map[used_template].add(page.title)
@@ -1019,6 +1828,25 @@ class Wtp:
                 self.set_template_pre_expand(page.title)
                 expand_stack.append(page)
 
+        self.db_conn.executemany(
+            """INSERT OR IGNORE INTO template_includes (template, used_template)
+            VALUES (?, ?)""",
+            (
+                (template, used_template)
+                for used_template, templates in included_map.items()
+                for template in templates
+            ),
+        )
+        if analyze_titles is not None:
+            # unchanged templates included by the analyzed templates
+            for title in self.page_store.need_pre_expand_titles(template_ns_id):
+                if (
+                    title not in analyze_titles
+                    and title.removeprefix(template_ns_local_name + ":")
+                    in included_map
+                ):
+                    expand_stack.append(Page(title, template_ns_id))
+
         # XXX consider encoding template bodies here (also need to save related
         # cookies).  This could speed up their expansion, where the first
         # operation is to encode them.  (Consider whether cookie numbers from
@@ -1035,7 +1863,6 @@ class Wtp:
                 continue
 
             for template_title in included_map[title_no_ns_prefix]:
-                self.get_page.cache_clear()  # avoid infinite loop
                 template = self.get_page(template_title, template_ns_id)
                 if not template or template.need_pre_expand:
                     continue
@@ -1044,32 +1871,44 @@ class Wtp:
                 expand_stack.append(template)
 
         # Also set `need_pre_expand` value for redirected source templates
-        query_str = """
-        UPDATE pages SET need_pre_expand = 1
-        FROM pages AS dest
-        WHERE pages.redirect_to = dest.title
-        AND pages.namespace_id = dest.namespace_id
-        AND dest.need_pre_expand = 1
-        AND pages.need_pre_expand = 0
-        """
-        self.db_conn.execute(query_str)
-
-        # set `need_pre_expand` value to redirected destination page
-        query_str = """
-        UPDATE pages SET need_pre_expand = 1
-        FROM pages AS source
-        WHERE pages.title = source.redirect_to
-        AND pages.namespace_id = source.namespace_id
-        AND source.need_pre_expand = 1
-        AND pages.need_pre_expand = 0
-        """
-        self.db_conn.execute(query_str)
+        # and redirected destination pages
+        self.page_store.propagate_redirect_need_pre_expand()
+        for namespace_id in self.template_catalog.namespace_ids:
+            self.template_catalog.update_need_pre_expand(
+                namespace_id,
+                self.page_store.need_pre_expand_titles(namespace_id),
+            )
+        self.template_catalog_changed()
+        self.save_template_catalog()
         self.db_conn.commit()
+        self.page_cache.clear()
+
+    def get_template_include_closure(self, titles: Set[str]) -> set[str]:
+        """Return the given template titles and the titles of templates that
+        include them directly or through other templates. Template uses are
+        saved by `analyze_templates()`."""
+        template_ns_local_name = self.NAMESPACE_DATA["Template"]["name"]
+        closure = set(titles)
+        stack = list(titles)
+        while len(stack) > 0:
+            title = stack.pop()
+            for (template,) in self.db_conn.execute(
+                """SELECT template FROM template_includes
+                WHERE used_template = ?""",
+                (title.removeprefix(template_ns_local_name + ":"),),
+            ):
+                if template not in closure:
+                    closure.add(template)
+                    stack.append(template)
+        return closure
 
     def set_template_pre_expand(self, name: str) -> None:
-        self.db_conn.execute(
-            "UPDATE pages SET need_pre_expand = 1 WHERE title = ?", (name,)
+        self.page_store.set_need_pre_expand(name)
+        self.invalidate_page_cache(name, self.NAMESPACE_DATA["Template"]["id"])
+        self.template_catalog.set_need_pre_expand(
+            name, self.NAMESPACE_DATA["Template"]["id"], True
         )
+        self.template_catalog_changed()
 
     def start_page(self, title: str) -> None:
         """Starts a new page for expanding Wikitext.  This saves the title
@@ -1551,8 +2390,12 @@ class Wtp:
                                 name, None
                             )
                             if template_page is not None:
-                                template_page.body = self._template_to_body(
-                                    name, template_page.body
+                                # don't change the cached page
+                                template_page = replace(
+                                    template_page,
+                                    body=self._template_to_body(
+                                        name, template_page.body
+                                    ),
                                 )
                         if (
                             template_page is not None
@@ -1719,13 +2562,72 @@ class Wtp:
         # print("    _finalize_expand:{!r}".format(text))
         return text
 
-    @lru_cache(maxsize=1000)
     def get_page(
         self,
         title: str,
         namespace_id: Optional[int] = None,
         no_redirect: bool = False,
     ) -> Optional[Page]:
+        normalized_title = self.normalize_title(title, namespace_id)
+        if normalized_title is None:
+            return None
+        title, upper_case_title = normalized_title
+
+        cache_key = (upper_case_title, namespace_id)
+        pages: Optional[list[Page]] = self.page_cache.get(cache_key)
+        if (
+            pages is None
+            and namespace_id is not None
+            and self.title_filter is not None
+            and not self.title_filter.may_contain(
+                upper_case_title, namespace_id
+            )
+        ):
+            pages = []
+        if pages is None:
+            try:
+                if namespace_id is None:
+                    rows = self.page_store.get_pages_by_title(title)
+                elif self.redirects_resolved:
+                    rows, target_rows = (
+                        self.page_store.get_pages_and_redirect_targets(
+                            upper_case_title, namespace_id
+                        )
+                    )
+                    self.cache_redirect_targets(rows, target_rows)
+                else:
+                    # one index search finds the title and the title
+                    # with upper case first letter
+                    rows = self.page_store.get_pages(
+                        upper_case_title, namespace_id
+                    )
+            except sqlite3.ProgrammingError as e:
+                raise sqlite3.ProgrammingError(
+                    f"{' '.join(e.args)} Current database file path: "
+                    f"{self.db_path}"
+                ) from e
+            pages = [self.page_from_row(row) for row in rows]
+            self.cache_pages(cache_key, pages)
+        # the exact title is preferred
+        for expected_title in (title, upper_case_title):
+            for page in pages:
+                if page.title == expected_title and not (
+                    no_redirect and page.redirect_to is not None
+                ):
+                    return page
+        return None
+
+    def normalize_title(
+        self, title: str, namespace_id: Optional[int]
+    ) -> Optional[tuple[str, str]]:
+        """Return the page title with namespace prefix and the title key
+        used to find the page, or `None` if the title is empty."""
+        normalized_title = self.page_cache.normalized_titles.get(
+            (title, namespace_id)
+        )
+        if normalized_title is not None:
+            return normalized_title
+        args = (title, namespace_id)
         # " " in Lua Module name is replaced by "_" in Wiktionary Lua code
         # when call `require`
         title = title.replace("_", " ")
@@ -1733,60 +2635,66 @@ class Wtp:
             title = title[5:]
         if len(title) == 0:
             return None
+        if namespace_id is None:
+            upper_case_title = title
+        else:
+            title = self._canonical_title(title, namespace_id)
+            upper_case_title = self._title_key(title, namespace_id)
+        self.page_cache.save_normalized_title(args, (title, upper_case_title))
+        return title, upper_case_title
 
-        upper_case_title = title  # the first letter is upper case
-        if namespace_id is not None and namespace_id != 0:
-            local_ns_name = self.LOCAL_NS_NAME_BY_ID[namespace_id]
-            ns_prefix = local_ns_name + ":"
-            if not title.startswith(ns_prefix):
-                if title.lower().startswith(
-                    self.namespace_prefixes(namespace_id)
-                ):
-                    # replace lower case and alias prefix
-                    title = ns_prefix + title[title.index(":") + 1 :]
-                else:
-                    title = ns_prefix + title
+    def cache_pages(
+        self, cache_key: tuple[str, Optional[int]], pages: list[Page]
+    ) -> None:
+        self.page_cache.put(
+            cache_key,
+            pages,
+            sum(
+                sys.getsizeof(page.title) + sys.getsizeof(page.body)
+                for page in pages
+            ),
+        )
 
-            # page title is case-sensitive except the first character
-            # https://www.mediawiki.org/wiki/Manual:Page_title#Naming_restrictions
-            template_name = title[len(ns_prefix) :]
-            upper_case_title = (
-                ns_prefix + template_name[:1].upper() + template_name[1:]
+    def cache_redirect_targets(
+        self, rows: list[PageRow], target_rows: RedirectTargetRows
+    ) -> None:
+        """Save redirect target pages found with the redirect pages to the
+        cache, `get_page_resolve_redirect()` then doesn't query them."""
+        for row in rows:
+            if row[0] not in target_rows:
+                continue
+            title_key, namespace_id, targets = target_rows[row[0]]
+            pages = [self.page_from_row(target) for target in targets]
+            self.cache_pages((title_key, namespace_id), pages)
+            # page title could have lower case first letter
+            target_title = title_key
+            for page in sorted(pages, key=lambda p: p.title != title_key):
+                if page.redirect_to is None:
+                    target_title = page.title
+                    break
+            self.page_cache.save_redirect_target(
+                (row[0], row[1]), (target_title, namespace_id)
             )
 
-        query_str = """
-        SELECT title, namespace_id, redirect_to, need_pre_expand, body, model
-        FROM pages
-        WHERE title = ?
-        """
-        query_values: list[Union[str, int]] = [title]
-        if namespace_id is not None:
-            query_str += " AND namespace_id = ?"
-            query_values.append(namespace_id)
-        if no_redirect:
-            query_str += " AND redirect_to IS NULL"
-        if upper_case_title != title:
-            query_str = query_str + " UNION ALL " + query_str
-            query_values = query_values + [upper_case_title] + query_values[1:]
-
-        query_str += " LIMIT 1"
-        try:
-            for result in self.db_conn.execute(query_str, tuple(query_values)):
-                return Page(
-                    title=result[0],
-                    namespace_id=result[1],
-                    redirect_to=result[2],
-                    need_pre_expand=result[3] == 1,
-                    body=result[4],
-                    model=result[5],
-                )
-        except sqlite3.ProgrammingError as e:
-            raise sqlite3.ProgrammingError(
-                f"{' '.join(e.args)} Current database file path: {self.db_path}"
-            ) from e
-        return None
+    def page_from_row(self, row: PageRow) -> Page:
+        return Page(
+            title=row[0],
+            namespace_id=row[1],
+            redirect_to=row[2],
+            need_pre_expand=row[3] == 1,
+            body=self.decompress_body(row[4]),
+            model=row[5],
+            page_id=row[6],
+        )
+
+    def get_page_by_id(self, page_id: int) -> Optional[Page]:
+        """Return the page of the page id in dump file."""
+        row = self.page_store.get_page_by_id(page_id)
+        return None if row is None else self.page_from_row(row)
 
     def page_exists(self, title: str, namespace_id: Optional[int] = 0) -> bool:
+        if namespace_id in self.template_catalog.namespace_ids:
+            return self.get_catalog_entry(title, namespace_id) is not None
         return self.get_page(title, namespace_id) is not None
 
     def get_all_pages(
@@ -1795,29 +2703,53 @@ class Wtp:
         include_redirects: bool = True,
         model: Optional[str] = None,
         search_pattern: Optional[str] = None,
+        body: str = "load",
+        shard: int = 0,
+        num_shards: int = 1,
     ) -> Iterator[Page]:
-        query_str = """
-        SELECT title, namespace_id, redirect_to, need_pre_expand, body, model
-        FROM pages
-        """
-        where_str, query_values = self.build_sql_where_query(
-            namespace_ids, include_redirects, model, search_pattern
-        )
-        query_str += where_str  # + " ORDER BY title ASC"
-        # Seems that ORDER BY title doesn't actually matter in this case;
-        # for other orderings it does, title just happens to be default
-        # print("Getting all pages for query:"
-        #       f"{query_str=!r}, {placeholders=!r}")
-
-        for result in self.db_conn.execute(query_str, query_values):
-            yield Page(
-                title=result[0],
-                namespace_id=result[1],
-                redirect_to=result[2],
-                need_pre_expand=result[3],
-                body=result[4],
-                model=result[5],
-            )
+        """`body` is "load", "lazy" (read when the `body` attribute is used)
+        or "skip" (`body` is `None`).
+
+        Pages are split to `num_shards` parts by database row id, only pages
+        of the part at index `shard` are returned. Parallel processes could
+        use different shard indexes to go through all pages."""
+        if body not in ("load", "lazy", "skip"):
+            raise ValueError(f"Unknown body option {body}")
+        if not 0 <= shard < num_shards:
+            raise ValueError(f"Shard {shard} is not in range({num_shards})")
+        for row in self.page_store.iter_pages(
+            namespace_ids,
+            include_redirects,
+            model,
+            search_pattern,
+            body == "load",
+            shard,
+            num_shards,
+        ):
+            if body == "lazy":
+                yield LazyPage(
+                    self,
+                    title=row[0],
+                    namespace_id=row[1],
+                    redirect_to=row[2],
+                    need_pre_expand=row[3] == 1,
+                    model=row[5],
+                    page_id=row[6],
+                )
+            else:
+                yield self.page_from_row(row)
+
+    def get_saved_page_body(
+        self, title: str, namespace_id: int
+    ) -> Optional[str]:
+        """Return the body of the page has exactly the same title, redirect
+        is not followed and the result is not cached."""
+        for row in self.page_store.get_pages(
+            self._title_key(title, namespace_id), namespace_id
+        ):
+            if row[0] == title:
+                return self.decompress_body(row[4])
+        return None
 
     def check_template_need_expand(
         self,
@@ -1825,20 +2757,22 @@ class Wtp:
         expand_names: Optional[Set[str]] = None,
         not_expand_names: Optional[Set[str]] = None,
     ) -> bool:
-        page = self.get_page(name, self.NAMESPACE_DATA["Template"]["id"])
-        if page is None:
+        if self.template_namespace_id is None:
+            return False
+        entry = self.get_catalog_entry(name, self.template_namespace_id)
+        if entry is None:
             return False
 
         if expand_names is None and not_expand_names is not None:
-            return name not in not_expand_names and page.need_pre_expand
+            return name not in not_expand_names and entry.need_pre_expand
         if expand_names is not None and not_expand_names is None:
-            return name in expand_names or page.need_pre_expand
+            return name in expand_names or entry.need_pre_expand
         if expand_names is not None and not_expand_names is not None:
             return name not in not_expand_names and (
-                name in expand_names or page.need_pre_expand
+                name in expand_names or entry.need_pre_expand
             )
 
-        return page.need_pre_expand
+        return entry.need_pre_expand
 
     def get_page_resolve_redirect(
         self, title: str, namespace_id: Optional[int]
@@ -1846,10 +2780,46 @@ class Wtp:
         page = self.get_page(title, namespace_id)
         if page is None:
             return None
-        if page.redirect_to is not None:
-            return self.get_page(page.redirect_to, namespace_id, True)
+        return self.follow_redirects(page)
+
+    def follow_redirects(self, page: Page) -> Optional[Page]:
+        """Return the last page of the redirect chain, or `None` if the
+        chain ends at a page not saved or the chain is a loop."""
+        visited = set()
+        while page.redirect_to is not None:
+            page_key = (page.title, page.namespace_id)
+            if page_key in visited:
+                return None
+            visited.add(page_key)
+            target = self.page_cache.redirect_targets.get(page_key)
+            if target is None:
+                target = self.redirect_target(
+                    page.redirect_to, page.namespace_id
+                )
+            target_page = self.get_page(*target)
+            if target_page is None:
+                return None
+            page = target_page
         return page
 
+    def redirect_target(
+        self, redirect_to: str, namespace_id: int
+    ) -> tuple[str, int]:
+        """Return the title and namespace id of the redirect target page.
+        The target is in the namespace of the redirect page if the title
+        doesn't have a namespace prefix, the prefix could be an alias or in
+        lower case."""
+        if ":" in redirect_to:
+            prefix = redirect_to[: redirect_to.index(":") + 1].lower()
+            prefix = prefix.replace("_", " ")
+            if prefix not in self.namespace_prefixes(namespace_id):
+                for ns_data in self.NAMESPACE_DATA.values():
+                    if ns_data["id"] != 0 and prefix in self.namespace_prefixes(
+                        ns_data["id"]
+                    ):
+                        return redirect_to, ns_data["id"]
+        return redirect_to, namespace_id
+
     def get_page_body(
         self, title: str, namespace_id: Optional[int]
     ) -> Optional[str]:
@@ -3,92 +3,658 @@
 # Copyright (c) 2018-2022 Tatu Ylonen.  See file LICENSE and https://ylonen.org
 
 import bz2
+import gzip
 import hashlib
+import io
 import json
+import lzma
 import os
 import shutil
 import subprocess
 import sys
+import tarfile
+import time
 import unicodedata
-from collections.abc import Callable
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, BinaryIO, TypedDict
 
 if TYPE_CHECKING:
+    from multiprocessing.pool import AsyncResult
+
+    from lxml import etree
+
     from .core import Page, Wtp
 
 from .interwiki import init_interwiki_map
 from .logging_utils import logger
 
+DumpFile = BinaryIO | io.BufferedIOBase
+
+
+@dataclass
+class DumpStats:
+    """Seconds spent in each stage of ``process_dump()`` and the amount of
+    processed data, used to find the bottleneck of dump processing.
+
+    In multistream mode, "decompression" and "xml_parsing" are the summed
+    times of the worker processes and "read_pages" is the time the main
+    process waited for parsed pages."""
+
+    seconds: dict[str, float] = field(default_factory=dict)
+    page_nums: int = 0
+    compressed_bytes: int = 0
+    decompressed_bytes: int = 0
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def merge(self, other: "DumpStats") -> None:
+        for stage, seconds in other.seconds.items():
+            self.add_time(stage, seconds)
+        self.page_nums += other.page_nums
+        self.compressed_bytes += other.compressed_bytes
+        self.decompressed_bytes += other.decompressed_bytes
+
+    def to_dict(self) -> dict[str, Any]:
+        extract_seconds = self.seconds.get("extract_dump", 0.0)
+
+        def rate(value: float) -> float:
+            return value / extract_seconds if extract_seconds > 0 else 0.0
+
+        return {
+            "seconds": dict(self.seconds),
+            "pages": self.page_nums,
+            "compressed_bytes": self.compressed_bytes,
+            "decompressed_bytes": self.decompressed_bytes,
+            "pages_per_second": rate(self.page_nums),
+            "compressed_mb_per_second": rate(self.compressed_bytes / 1e6),
+            "decompressed_mb_per_second": rate(self.decompressed_bytes / 1e6),
+        }
+
+    def save(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class TimedReader(io.BufferedIOBase):
+    """Wrap a decompressed dump stream to count the read bytes and the time
+    spent in decompression, or waiting for the decompression process."""
+
+    def __init__(self, stream: DumpFile, stats: DumpStats):
+        self.stream = stream
+        self.stats = stats
+
+    def read(self, size: int | None = -1) -> bytes:
+        start = time.perf_counter()
+        data = self.stream.read(-1 if size is None else size)
+        self.stats.add_time("decompression", time.perf_counter() - start)
+        self.stats.decompressed_bytes += len(data)
+        return data
+
+
+def open_zstd_file(dump_path: str, mode: str = "rb") -> DumpFile:
+    try:
+        from compression import zstd  # type: ignore[import-not-found]
+
+        return zstd.open(dump_path, mode)
+    except ImportError:
+        pass
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        return zstandard.open(dump_path, mode)
+    except ImportError as e:
+        raise ImportError(
+            "Install the zstd command or the zstandard package to open "
+            f"{dump_path}"
+        ) from e
+
+
+@dataclass
+class DumpDecompressor:
+    # Commands that write the decompressed file to stdout, the dump file path
+    # is appended. The first installed command is used, these commands run in
+    # another process and some of them use multiple threads.
+    commands: list[list[str]]
+    # Used if none of the commands is installed
+    open_file: Callable[[str], DumpFile]
+
+
+# Keys are dump file extensions, add new items to support other formats
+DUMP_DECOMPRESSORS: dict[str, DumpDecompressor] = {
+    ".bz2": DumpDecompressor(
+        [["lbzcat"], ["bzcat"]], partial(bz2.open, mode="rb")
+    ),
+    ".zst": DumpDecompressor([["zstd", "-T0", "-dcq"]], open_zstd_file),
+    ".gz": DumpDecompressor(
+        [["pigz", "-dc"], ["gzip", "-dc"]], partial(gzip.open, mode="rb")
+    ),
+    ".xz": DumpDecompressor(
+        [["xz", "-T0", "-dc"]], partial(lzma.open, mode="rb")
+    ),
+    ".xml": DumpDecompressor([], lambda path: open(path, "rb")),
+}
+
+
+@dataclass
+class FileCompressor:
+    # Commands that compress stdin to stdout, the first installed command is
+    # used and it runs in another process with multiple threads if possible.
+    commands: list[list[str]]
+    # Used if none of the commands is installed
+    open_file: Callable[[str], DumpFile]
+
+
+# Keys are extensions of the files created by `compress_file()`
+FILE_COMPRESSORS: dict[str, FileCompressor] = {
+    ".bz2": FileCompressor(
+        [["lbzip2", "-c"], ["bzip2", "-c"]], partial(bz2.open, mode="wb")
+    ),
+    ".zst": FileCompressor(
+        [["zstd", "-T0", "-cq"]], partial(open_zstd_file, mode="wb")
+    ),
+    ".gz": FileCompressor(
+        [["pigz", "-c"], ["gzip", "-c"]], partial(gzip.open, mode="wb")
+    ),
+    ".xz": FileCompressor([["xz", "-T0", "-c"]], partial(lzma.open, mode="wb")),
+}
+
+
+@contextmanager
+def compress_file(path: Path) -> Iterator[DumpFile]:
+    """Return a file object, data written to it is compressed by the format
+    of the file extension and saved to `path`. Files with other extensions
+    are not compressed."""
+    compressor = FILE_COMPRESSORS.get(path.suffix)
+    if compressor is None:
+        with path.open("wb") as f:
+            yield f
+        return
+
+    for command in compressor.commands:
+        if shutil.which(command[0]) is not None:
+            with (
+                path.open("wb") as f,
+                subprocess.Popen(command, stdin=subprocess.PIPE, stdout=f) as p,
+            ):
+                yield p.stdin  # type: ignore
+            if p.returncode != 0:
+                raise subprocess.CalledProcessError(p.returncode, command)
+            return
+
+    with compressor.open_file(str(path)) as compressed_file:
+        yield compressed_file
+
+
+def decompress_dump_file(dump_path: str) -> subprocess.Popen | DumpFile:
+    """Return a process that writes the decompressed dump file to stdout or
+    a file object. Uncompressed XML data is read from stdin if `dump_path`
+    is "-"."""
+    if dump_path == "-":
+        return sys.stdin.buffer
+
+    suffix = Path(dump_path).suffix
+    decompressor = DUMP_DECOMPRESSORS.get(suffix)
+    if decompressor is None:
+        raise ValueError(f"Dump file extension {suffix} is not supported")
+
+    for command in decompressor.commands:
+        if shutil.which(command[0]) is not None:
+            p = subprocess.Popen(command + [dump_path], stdout=subprocess.PIPE)
+            if p.stdout is not None:
+                return p
+            else:
+                raise Exception(f"No stdout from command {command[0]}")
+    return decompressor.open_file(dump_path)
+
+
+class DumpPageData(TypedDict):
+    title: str
+    namespace_id: int
+    body: str | None
+    redirect_to: str | None
+    model: str
+    revision_id: int | None
+    sha1: str | None
+    page_id: int | None
+
 
-def decompress_dump_file(
+@dataclass
+class DumpCheckpoint:
+    """Position of the saved pages of a dump file, used to resume parsing
+    the dump file after the process is interrupted."""
+
+    dump_file: str
+    # id of the last saved page, pages are sorted by id in dump files
+    page_id: int | None = None
+    # offset of the first bz2 stream of multistream dump file that could
+    # have unsaved pages
+    byte_offset: int | None = None
+
+
+# Number of pages saved between checkpoints
+DUMP_CHECKPOINT_INTERVAL = 10000
+
+
+def init_dump_checkpoints(wtp: "Wtp") -> None:
+    wtp.db_conn.execute(
+        """
+    CREATE TABLE IF NOT EXISTS dump_checkpoints (
+    dump_file TEXT PRIMARY KEY,
+    page_id INTEGER,
+    byte_offset INTEGER)
+    """
+    )
+
+
+def get_dump_checkpoint(wtp: "Wtp", dump_path: str) -> DumpCheckpoint:
+    init_dump_checkpoints(wtp)
+    dump_file = Path(dump_path).name
+    for page_id, byte_offset in wtp.db_conn.execute(
+        "SELECT page_id, byte_offset FROM dump_checkpoints WHERE dump_file = ?",
+        (dump_file,),
+    ):
+        return DumpCheckpoint(dump_file, page_id, byte_offset)
+    return DumpCheckpoint(dump_file)
+
+
+def save_dump_checkpoint(wtp: "Wtp", checkpoint: DumpCheckpoint) -> None:
+    """Commit the checkpoint in the same transaction as the saved pages."""
+    if wtp.bulk_load_rows is not None:
+        wtp.save_bulk_load_rows()
+    wtp.db_conn.execute(
+        "INSERT OR REPLACE INTO dump_checkpoints VALUES(?, ?, ?)",
+        (checkpoint.dump_file, checkpoint.page_id, checkpoint.byte_offset),
+    )
+    wtp.db_conn.commit()
+
+
+def delete_dump_checkpoint(wtp: "Wtp", checkpoint: DumpCheckpoint) -> None:
+    wtp.db_conn.execute(
+        "DELETE FROM dump_checkpoints WHERE dump_file = ?",
+        (checkpoint.dump_file,),
+    )
+
+
+def parse_page_element(
+    page_element: "etree._Element", namespace_ids: set[int]
+) -> DumpPageData | None:
+    """Extract the data saved to the database from a `<page>` element, or
+    return `None` if the page should be ignored."""
+    title = page_element.findtext("{*}title", "")
+    namespace_id = int(page_element.findtext("{*}ns", "0"))
+    if (
+        namespace_id not in namespace_ids
+        or title.endswith("/documentation")
+        or "/testcases" in title
+    ):
+        return None
+
+    text: str | None = None
+    redirect_to: str | None = None
+    model = page_element.findtext("{*}revision/{*}model", "")
+    if (redirect_element := page_element.find("{*}redirect")) is not None:
+        redirect_to = redirect_element.get("title", "")
+        # redirect_to existing implies a redirection, but having a
+        # .get default to "" is a bit weird: redirect to empty string?
+        # But you can't use None either..?
+    else:
+        if model not in {"wikitext", "Scribunto", "json"}:
+            # ignore css, javascript and sanitized-css pages
+            return None
+        text = page_element.findtext("{*}revision/{*}text", "")
+
+    revision_id = page_element.findtext("{*}revision/{*}id")
+    page_id = page_element.findtext("{*}id")
+    # `<sha1/>` of suppressed or deleted revisions is empty, these pages
+    # are always updated
+    sha1 = (page_element.findtext("{*}revision/{*}sha1") or "").strip()
+    return {
+        "title": title,
+        "namespace_id": namespace_id,
+        "body": text,
+        "redirect_to": redirect_to,
+        "model": model,
+        "revision_id": int(revision_id) if revision_id is not None else None,
+        "sha1": sha1 or None,
+        "page_id": int(page_id) if page_id is not None else None,
+    }
+
+
+def parse_dump_xml(
+    wtp: "Wtp",
     dump_path: str,
-) -> subprocess.Popen | bz2.BZ2File:
-    if dump_path.endswith(".bz2"):
-        if shutil.which("lbzcat") is None and shutil.which("bzcat") is None:
-            return bz2.open(dump_path, "rb")
+    namespace_ids: set[int],
+    index_path: str | None = None,
+    num_processes: int | None = None,
+    stats: DumpStats | None = None,
+    resumable: bool = False,
+) -> set[str] | None:
+    """Save pages of the dump file to the database. If `index_path` points to
+    the "-multistream-index.txt.bz2" file of a "-multistream.xml.bz2" dump
+    file, the bz2 streams are decompressed and parsed in `num_processes`
+    worker processes.
+
+    Pages that have the same revision SHA-1 as the saved pages are not
+    updated. Returns the titles of added or changed pages if the database
+    already has pages, otherwise `None` because all pages are new.
+
+    Stage times are added to `stats` if it's not `None`.
 
-        decompress_command = (
-            "lbzcat" if shutil.which("lbzcat") is not None else "bzcat"
+    If `resumable` is `True`, a checkpoint is committed with the saved
+    pages periodically, and parsing starts after the pages of the last
+    checkpoint if the previous call was interrupted. Bz2 streams before the
+    checkpoint are not read if the dump file has an index file."""
+    if stats is None:
+        stats = DumpStats()
+    checkpoint = get_dump_checkpoint(wtp, dump_path) if resumable else None
+    if checkpoint is not None and checkpoint.page_id is not None:
+        logger.info(
+            f"Resume from page id {checkpoint.page_id}, "
+            f"byte offset {checkpoint.byte_offset}"
         )
-        p = subprocess.Popen(
-            [decompress_command, dump_path], stdout=subprocess.PIPE
+    if index_path is not None:
+        pages: Iterable[DumpPageData] = iter_multistream_dump_pages(
+            dump_path,
+            index_path,
+            namespace_ids,
+            num_processes,
+            stats=stats,
+            checkpoint=checkpoint,
         )
-        if p.stdout is not None:
-            return p
-        else:
-            raise Exception(f"No stdout from command {decompress_command}")
     else:
-        raise ValueError("Dump file extension is not .bz2")
+        pages = iter_dump_pages(dump_path, namespace_ids, stats)
+    if checkpoint is not None and checkpoint.page_id is not None:
+        saved_page_id = checkpoint.page_id
+        pages = (
+            page
+            for page in pages
+            if page["page_id"] is None or page["page_id"] > saved_page_id
+        )
+    changed_titles = save_dump_pages(wtp, pages, stats, checkpoint)
+    if checkpoint is not None:
+        delete_dump_checkpoint(wtp, checkpoint)
+        wtp.db_conn.commit()
+    if wtp.bulk_load_rows is None:
+        # the filter is built at the end of bulk load
+        wtp.save_title_filter()
+    return changed_titles
 
 
-def parse_dump_xml(wtp: "Wtp", dump_path: str, namespace_ids: set[int]) -> None:
-    from lxml import etree
+def save_dump_pages(
+    wtp: "Wtp",
+    pages: Iterable[DumpPageData],
+    stats: DumpStats | None = None,
+    checkpoint: DumpCheckpoint | None = None,
+) -> set[str] | None:
+    if stats is None:
+        stats = DumpStats()
+    changed_titles: set[str] | None = set() if wtp.has_pages() else None
+    page_nums = 0
+    read_seconds = 0.0
+    save_seconds = 0.0
+    page_iter = iter(pages)
+    while True:
+        start = time.perf_counter()
+        page = next(page_iter, None)
+        read_end = time.perf_counter()
+        read_seconds += read_end - start
+        if page is None:
+            break
+        if wtp.add_page(**page) and changed_titles is not None:
+            changed_titles.add(page["title"])
+        page_nums += 1
+        if checkpoint is not None and page["page_id"] is not None:
+            checkpoint.page_id = page["page_id"]
+            if page_nums % DUMP_CHECKPOINT_INTERVAL == 0:
+                save_dump_checkpoint(wtp, checkpoint)
+        save_seconds += time.perf_counter() - read_end
+        if page_nums % 10000 == 0:
+            logger.info(f"  ... {page_nums} raw pages collected")
+    stats.add_time("read_pages", read_seconds)
+    stats.add_time("save_pages", save_seconds)
+    stats.page_nums += page_nums
+    if changed_titles is not None:
+        logger.info(f"{len(changed_titles)} of {page_nums} pages changed")
+    return changed_titles
 
+
+def iter_dump_pages(
+    dump_path: str, namespace_ids: set[int], stats: DumpStats | None = None
+) -> Iterator[DumpPageData]:
+    if stats is None:
+        stats = DumpStats()
+    if dump_path != "-":
+        stats.compressed_bytes += os.path.getsize(dump_path)
+    decompression_seconds = stats.seconds.get("decompression", 0.0)
+    parse_seconds = 0.0
+    start = time.perf_counter()
     with decompress_dump_file(dump_path) as p:
-        page_nums = 0
-        for _, page_element in etree.iterparse(
-            p.stdout if isinstance(p, subprocess.Popen) else p,  # type: ignore
-            tag="{*}page",
+        for page in parse_page_xmls(
+            TimedReader(
+                p.stdout if isinstance(p, subprocess.Popen) else p,  # type: ignore
+                stats,
+            ),
+            namespace_ids,
         ):
-            title = page_element.findtext("{*}title", "")
-            namespace_id = int(page_element.findtext("{*}ns", "0"))
-            if (
-                namespace_id not in namespace_ids
-                or title.endswith("/documentation")
-                or "/testcases" in title
-            ):
-                page_element.clear(keep_tail=True)
+            parse_seconds += time.perf_counter() - start
+            yield page
+            start = time.perf_counter()
+    parse_seconds += time.perf_counter() - start
+    # reading the stream is included in the time of `parse_page_xmls()`
+    stats.add_time(
+        "xml_parsing",
+        parse_seconds
+        - (stats.seconds.get("decompression", 0.0) - decompression_seconds),
+    )
+
+
+def parse_page_xmls(
+    stream: DumpFile, namespace_ids: set[int]
+) -> Iterator[DumpPageData]:
+    from lxml import etree
+
+    for page_xml in iter_page_xmls(stream, namespace_ids):
+        page = parse_page_element(etree.fromstring(page_xml), namespace_ids)
+        if page is not None:
+            yield page
+
+
+def iter_page_xmls(
+    stream: DumpFile, namespace_ids: set[int], chunk_size: int = 1 << 20
+) -> Iterator[bytes]:
+    """Find `<page>` elements in the decompressed XML data and return the
+    bytes of the elements that have a `<ns>` value in `namespace_ids`.
+    Other pages are discarded without parsing their text, this is possible
+    because "<" in text is always escaped."""
+    buffer = bytearray()
+    search_start = 0
+    page_start = -1
+    namespace_id: int | None = None
+    while True:
+        if page_start == -1:
+            page_start = buffer.find(b"<page>", search_start)
+            if page_start == -1:
+                # keep the data that could be a part of the start tag
+                del buffer[: max(len(buffer) - len(b"<page>") + 1, 0)]
+                search_start = 0
+        if page_start != -1 and namespace_id is None:
+            ns_end = buffer.find(b"</ns>", page_start)
+            if ns_end != -1:
+                ns_start = buffer.rfind(b"<ns>", page_start, ns_end)
+                namespace_id = int(buffer[ns_start + len(b"<ns>") : ns_end])
+                search_start = ns_end
+        if namespace_id is not None:
+            page_end = buffer.find(b"</page>", search_start)
+            if page_end != -1:
+                page_end += len(b"</page>")
+                if namespace_id in namespace_ids:
+                    yield bytes(buffer[page_start:page_end])
+                del buffer[:page_end]
+                search_start = 0
+                page_start = -1
+                namespace_id = None
                 continue
+            search_start = max(len(buffer) - len(b"</page>") + 1, search_start)
+            if namespace_id not in namespace_ids:
+                # discard the text of unwanted page
+                del buffer[:search_start]
+                page_start = search_start = 0
 
-            text: str | None = None
-            redirect_to: str | None = None
-            model = page_element.findtext("{*}revision/{*}model", "")
-            if (
-                redirect_element := page_element.find("{*}redirect")
-            ) is not None:
-                redirect_to = redirect_element.get("title", "")
-                # redirect_to existing implies a redirection, but having a
-                # .get default to "" is a bit weird: redirect to empty string?
-                # But you can't use None either..?
-            else:
-                if model not in {"wikitext", "Scribunto", "json"}:
-                    # ignore css, javascript and sanitized-css pages
-                    page_element.clear(keep_tail=True)
-                    continue
-                text = page_element.findtext("{*}revision/{*}text", "")
-
-            wtp.add_page(
-                title,
-                namespace_id,
-                body=text,
-                redirect_to=redirect_to,
-                model=model,
+        chunk = stream.read(chunk_size)
+        if len(chunk) == 0:
+            return
+        buffer += chunk
+
+
+# Parsed byte ranges waiting to be saved per worker process
+MAX_PENDING_RANGES_PER_PROCESS = 2
+
+
+def read_multistream_index(index_path: str) -> list[int]:
+    """Return the sorted start offsets of the bz2 streams listed in a
+    multistream index file. Each line of the file has the format
+    "offset:page_id:title"."""
+    offsets = set()
+    with bz2.open(index_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip() != "":
+                offsets.add(int(line.split(":", 1)[0]))
+    return sorted(offsets)
+
+
+def split_multistream_ranges(
+    offsets: list[int], file_size: int, streams_per_range: int
+) -> list[tuple[int, int]]:
+    """Group consecutive bz2 streams into `(start, end)` byte ranges, each
+    range is decompressed and parsed by one worker process."""
+    ranges = []
+    for index in range(0, len(offsets), streams_per_range):
+        end_index = index + streams_per_range
+        ranges.append(
+            (
+                offsets[index],
+                offsets[end_index] if end_index < len(offsets) else file_size,
             )
-            page_element.clear(keep_tail=True)
-            page_nums += 1
-            if page_nums % 10000 == 0:
-                logger.info(f"  ... {page_nums} raw pages collected")
+        )
+    return ranges
+
+
+def parse_multistream_range(
+    dump_path: str, namespace_ids: set[int], byte_range: tuple[int, int]
+) -> tuple[list[DumpPageData], DumpStats]:
+    """Decompress and parse the pages in a byte range of a multistream dump
+    file. This function runs in worker processes."""
+    start, end = byte_range
+    stats = DumpStats(compressed_bytes=end - start)
+    with open(dump_path, "rb") as f:
+        f.seek(start)
+        compressed_data = f.read(end - start)
+    with stats.timer("decompression"):
+        # `bz2.decompress()` supports multiple concatenated streams
+        data = bz2.decompress(compressed_data)
+    stats.decompressed_bytes = len(data)
+    with stats.timer("xml_parsing"):
+        pages = list(parse_page_xmls(io.BytesIO(data), namespace_ids))
+    return pages, stats
+
+
+def parse_multistream_dump_xml(
+    wtp: "Wtp",
+    dump_path: str,
+    index_path: str,
+    namespace_ids: set[int],
+    num_processes: int | None = None,
+    streams_per_range: int = 50,
+    stats: DumpStats | None = None,
+) -> set[str] | None:
+    if stats is None:
+        stats = DumpStats()
+    return save_dump_pages(
+        wtp,
+        iter_multistream_dump_pages(
+            dump_path,
+            index_path,
+            namespace_ids,
+            num_processes,
+            streams_per_range,
+            stats,
+        ),
+        stats,
+    )
+
+
+def iter_multistream_dump_pages(
+    dump_path: str,
+    index_path: str,
+    namespace_ids: set[int],
+    num_processes: int | None = None,
+    streams_per_range: int = 50,
+    stats: DumpStats | None = None,
+    checkpoint: DumpCheckpoint | None = None,
+) -> Iterator[DumpPageData]:
+    from multiprocessing import Pool
+
+    offsets = read_multistream_index(index_path)
+    if checkpoint is not None and checkpoint.byte_offset is not None:
+        # seek to the first stream that could have unsaved pages
+        resume_offset = checkpoint.byte_offset
+        offsets = [offset for offset in offsets if offset >= resume_offset]
+    ranges = split_multistream_ranges(
+        offsets, os.path.getsize(dump_path), streams_per_range
+    )
+    if num_processes is None:
+        num_processes = os.cpu_count() or 1
+    logger.info(
+        f"Parsing {len(offsets)} bz2 streams in {len(ranges)} parts with "
+        f"{num_processes} processes"
+    )
+    with Pool(num_processes) as pool:
+
+        def parse_range(byte_range: tuple[int, int]) -> "AsyncResult":
+            return pool.apply_async(
+                parse_multistream_range, (dump_path, namespace_ids, byte_range)
+            )
+
+        # Parsed pages wait in the main process until they are saved, so
+        # only a few ranges are parsed ahead of the saved pages. Results are
+        # used in the dump order, later pages overwrite earlier pages with
+        # the same title like in `parse_dump_xml()`.
+        range_iter = iter(ranges)
+        pending: deque[tuple[int, "AsyncResult"]] = deque(
+            (byte_range[1], parse_range(byte_range))
+            for byte_range in islice(
+                range_iter, num_processes * MAX_PENDING_RANGES_PER_PROCESS
+            )
+        )
+        while len(pending) > 0:
+            range_end, result = pending.popleft()
+            pages, range_stats = result.get()
+            next_range = next(range_iter, None)
+            if next_range is not None:
+                pending.append((next_range[1], parse_range(next_range)))
+            if stats is not None:
+                # pages are counted in `save_dump_pages()`
+                stats.merge(range_stats)
+            yield from pages
+            if checkpoint is not None:
+                # all pages before this offset are saved when the generator
+                # is resumed after the last page
+                checkpoint.byte_offset = range_end
 
 
 def process_dump(
@@ -100,12 +666,43 @@ def process_dump(
     save_pages_path: Path | None = None,
     analyze_template_func: Callable[["Wtp", "Page"], tuple[set[str], bool]]
     | None = None,
-) -> None:
+    index_path: str | None = None,
+    num_processes: int | None = None,
+    bulk_load: bool = False,
+    stats: DumpStats | None = None,
+    stats_path: Path | None = None,
+    resumable: bool = False,
+    optimize_db: bool = False,
+) -> set[str] | None:
     """Parses a WikiMedia dump file ``path`` (which should point to a
-    "<project>-<date>-pages-articles.xml.bz2" file.  This implements
+    "<project>-<date>-pages-articles.xml.bz2" file, or the same file
+    compressed in other formats in ``DUMP_DECOMPRESSORS``).  This implements
     the first phase of processing a dump - copying it to a temporary
     file with some preprocessing.  The Wtp.reprocess() must then be
-    called to actually process the data."""
+    called to actually process the data.
+
+    If ``path`` is a "-pages-articles-multistream.xml.bz2" file,
+    ``index_path`` could be set to the path of its
+    "-pages-articles-multistream-index.txt.bz2" file to parse the dump file
+    in ``num_processes`` processes.
+
+    Set ``bulk_load`` to ``True`` to save pages with ``Wtp.bulk_load()``,
+    this is faster but the database file can't be used if the process
+    crashes.
+
+    Set ``resumable`` to ``True`` to commit checkpoints while saving pages,
+    calling this function again after the process is killed continues from
+    the last checkpoint.
+
+    If the database already has pages, unchanged pages are skipped by
+    comparing revision SHA-1, only changed templates are analyzed again and
+    the titles of changed pages are returned.
+
+    The time spent in each stage and the throughput are added to ``stats``,
+    logged and saved to the JSON file ``stats_path`` if it's not ``None``.
+
+    Set ``optimize_db`` to ``True`` to call ``Wtp.optimize_db()`` at the end,
+    it takes about as long as copying the database file."""
 
     logger.info(
         f"skip_extract_dump: {skip_extract_dump}, save_pages_path: "
@@ -113,18 +710,120 @@ def process_dump(
     )
     logger.info(f"dump file path: {path}")
 
-    # Run Phase 1 in a single thread; this mostly just extracts pages into
-    # a SQLite database file.
+    # Phase 1 mostly just extracts pages into a SQLite database file, the
+    # dump file is only parsed in multiple processes if it has an index file.
+    if stats is None:
+        stats = DumpStats()
+    total_start = time.perf_counter()
+    changed_titles = None
+    resumed = False
     if not skip_extract_dump:
-        parse_dump_xml(wtp, path, namespace_ids)
+        resumed = (
+            resumable and get_dump_checkpoint(wtp, path).page_id is not None
+        )
+        with (
+            stats.timer("extract_dump"),
+            wtp.bulk_load(resumable=resumable) if bulk_load else nullcontext(),
+        ):
+            changed_titles = parse_dump_xml(
+                wtp,
+                path,
+                namespace_ids,
+                index_path,
+                num_processes,
+                stats,
+                resumable,
+            )
         if save_pages_path is not None:
-            save_pages_to_file(wtp, save_pages_path)
-        init_interwiki_map(wtp)
+            with stats.timer("save_pages_to_file"):
+                save_pages_to_file(wtp, save_pages_path)
+        if not wtp.redirects_resolved:
+            # resolved at the end of bulk load
+            with stats.timer("resolve_redirects"):
+                wtp.resolve_redirects()
+        with stats.timer("init_interwiki_map"):
+            init_interwiki_map(wtp)
 
     add_default_templates(wtp)
+    if (
+        changed_titles is not None
+        and analyze_template_func is not None
+        and wtp.has_analyzed_templates()
+    ):
+        template_ns_prefix = wtp.NAMESPACE_DATA["Template"]["name"] + ":"
+        with stats.timer("analyze_templates"):
+            wtp.analyze_templates(
+                analyze_template_func,
+                # pages changed before the interruption are unknown
+                None
+                if resumed
+                else {
+                    t
+                    for t in changed_titles
+                    if t.startswith(template_ns_prefix)
+                },
+            )
     analyze_and_overwrite_pages(
-        wtp, overwrite_folders, skip_extract_dump, analyze_template_func
+        wtp, overwrite_folders, skip_extract_dump, analyze_template_func, stats
     )
+    # default and overwritten pages are added to the filter and statistics
+    wtp.save_title_filter()
+    wtp.save_site_stats()
+    if not wtp.redirects_resolved:
+        # overwritten redirect pages
+        wtp.resolve_redirects()
+    wtp.db_conn.commit()
+    if optimize_db:
+        with stats.timer("optimize_db"):
+            wtp.optimize_db()
+    stats.add_time("total", time.perf_counter() - total_start)
+    logger.info(f"process_dump stats: {json.dumps(stats.to_dict())}")
+    if stats_path is not None:
+        stats.save(stats_path)
+    return changed_titles
+
+
+def process_incremental_dump(
+    wtp: "Wtp",
+    path: str,
+    namespace_ids: set[int],
+    deleted_titles: Iterable[str] = (),
+    analyze_template_func: Callable[["Wtp", "Page"], tuple[set[str], bool]]
+    | None = None,
+) -> set[str]:
+    """Apply an adds-changes dump file or other partial XML export to a
+    database created by ``process_dump()``. Pages in the dump file are added
+    or updated if their revision SHA-1 changed, pages of ``deleted_titles``
+    are deleted. Then only the changed templates and the templates that
+    include them are analyzed again. Returns the titles of changed pages."""
+    logger.info(f"incremental dump file path: {path}")
+    template_ns_id = wtp.NAMESPACE_DATA["Template"]["id"]
+    changed_titles = set()
+    changed_templates = set()
+    for page in iter_dump_pages(path, namespace_ids):
+        if not wtp.add_page(**page):
+            continue
+        changed_titles.add(page["title"])
+        if page["namespace_id"] == template_ns_id:
+            changed_templates.add(page["title"])
+    for title in deleted_titles:
+        namespace_id = 0
+        if ":" in title:
+            namespace_id = wtp.NS_ID_BY_LOCAL_NAME.get(
+                title[: title.find(":")], 0
+            )
+        wtp.delete_page(title, namespace_id)
+        changed_titles.add(title)
+        if namespace_id == template_ns_id:
+            changed_templates.add(title)
+    wtp.db_conn.commit()
+    logger.info(f"{len(changed_titles)} pages changed")
+    if not wtp.redirects_resolved:
+        wtp.resolve_redirects()
+
+    if analyze_template_func is not None and len(changed_templates) > 0:
+        wtp.analyze_templates(analyze_template_func, changed_templates)
+    return changed_titles
 
 
 def add_default_templates(wtp: "Wtp") -> None:
@@ -150,26 +849,34 @@ def analyze_and_overwrite_pages(
     skip_extract_dump: bool,
     analyze_template_func: Callable[["Wtp", "Page"], tuple[set[str], bool]]
     | None = None,
+    stats: DumpStats | None = None,
 ) -> None:
+    if stats is None:
+        stats = DumpStats()
     if overwrite_folders is not None:
         if overwrite_pages(wtp, overwrite_folders, False):
             # has template
             if skip_extract_dump:
-                wtp.backup_db()
-            overwrite_pages(wtp, overwrite_folders, True)
+                wtp.backup_overwritten_pages()
+            with stats.timer("overwrite_pages"):
+                overwrite_pages(wtp, overwrite_folders, True)
             if analyze_template_func is not None:
-                wtp.analyze_templates(analyze_template_func)
+                with stats.timer("analyze_templates"):
+                    wtp.analyze_templates(analyze_template_func)
         else:
             if (
                 analyze_template_func is not None
                 and not wtp.has_analyzed_templates()
             ):
-                wtp.analyze_templates(analyze_template_func)
+                with stats.timer("analyze_templates"):
+                    wtp.analyze_templates(analyze_template_func)
             if skip_extract_dump:
-                wtp.backup_db()
-            overwrite_pages(wtp, overwrite_folders, True)
+                wtp.backup_overwritten_pages()
+            with stats.timer("overwrite_pages"):
+                overwrite_pages(wtp, overwrite_folders, True)
     elif analyze_template_func is not None and not wtp.has_analyzed_templates():
-        wtp.analyze_templates(analyze_template_func)
+        with stats.timer("analyze_templates"):
+            wtp.analyze_templates(analyze_template_func)
     if analyze_template_func is not None:
         wtp.db_conn.commit()
 
@@ -204,6 +911,15 @@ def overwrite_pages(
                         return True
             continue
 
+        if folder_path.is_file() and is_tar_file_path(folder_path):
+            for title, body in iter_tar_file_pages(folder_path):
+                is_template = overwrite_single_page(
+                    wtp, title, do_overwrite, body=body
+                )
+                if not do_overwrite and is_template:
+                    return True
+            continue
+
         if not folder_path.is_dir():
             continue
         # old overwrite file format that stars with "TTILE: "
@@ -317,32 +1033,102 @@ def replace_invalid_windows_characters(s: str) -> str:
 
 
 def save_pages_to_file(wtp: "Wtp", directory: Path) -> None:
+    """Save each page to a text file starts with "TITLE: <page title>" line.
+    If `directory` is a tar file path like "pages.tar" or "pages.tar.zst",
+    the files are written to one archive stream instead of creating a file
+    for each page, the archive could be passed to `overwrite_pages()`."""
+    if is_tar_file_path(directory):
+        save_pages_to_tar_file(wtp, directory)
+        return
+
     on_windows = path_is_on_windows_partition(directory)
     name_max_length = os.pathconf("/", "PC_NAME_MAX")
     for page in wtp.get_all_pages():
-        title = replace_invalid_substrings(page.title)
-        if on_windows:
-            title = replace_invalid_windows_characters(title)
+        file_path = directory.joinpath(
+            page_file_path(page, on_windows, name_max_length)
+        )
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with file_path.open("w", encoding="utf-8") as f:
+            f.write(page_file_text(page))
 
-        if page.namespace_id == 0:
-            file_path = directory.joinpath(f"Words/{title[0:2]}/{title}.txt")
-        else:
-            file_path = directory.joinpath(f"{title.replace(':', '/', 1)}.txt")
 
-        if len(file_path.name.encode()) > name_max_length:
-            file_path = file_path.with_stem(
-                file_path.stem[:50]
-                + "_"
-                + hashlib.sha256(file_path.stem.encode("utf-8")).hexdigest()
+def save_pages_to_tar_file(wtp: "Wtp", tar_path: Path) -> None:
+    name_max_length = os.pathconf("/", "PC_NAME_MAX")
+    with (
+        compress_file(tar_path) as f,
+        tarfile.open(fileobj=f, mode="w|", format=tarfile.PAX_FORMAT) as tar,
+    ):
+        for page in wtp.get_all_pages():
+            data = page_file_text(page).encode("utf-8")
+            tar_info = tarfile.TarInfo(
+                page_file_path(page, False, name_max_length).as_posix()
             )
+            tar_info.size = len(data)
+            tar.addfile(tar_info, io.BytesIO(data))
 
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        with file_path.open("w", encoding="utf-8") as f:
-            f.write(f"TITLE: {page.title}\n")
-            if page.body is not None:
-                f.write(page.body)
-            elif page.redirect_to:
-                f.write(page.redirect_to)
+
+def page_file_path(
+    page: "Page", on_windows: bool, name_max_length: int
+) -> Path:
+    title = replace_invalid_substrings(page.title)
+    if on_windows:
+        title = replace_invalid_windows_characters(title)
+
+    if page.namespace_id == 0:
+        file_path = Path(f"Words/{title[0:2]}/{title}.txt")
+    else:
+        file_path = Path(f"{title.replace(':', '/', 1)}.txt")
+
+    if len(file_path.name.encode()) > name_max_length:
+        file_path = file_path.with_stem(
+            file_path.stem[:50]
+            + "_"
+            + hashlib.sha256(file_path.stem.encode("utf-8")).hexdigest()
+        )
+    return file_path
+
+
+def page_file_text(page: "Page") -> str:
+    text = f"TITLE: {page.title}\n"
+    if page.body is not None:
+        text += page.body
+    elif page.redirect_to:
+        text += page.redirect_to
+    return text
+
+
+def is_tar_file_path(path: Path) -> bool:
+    return path.suffix == ".tar" or (
+        path.suffix in FILE_COMPRESSORS
+        and len(path.suffixes) > 1
+        and path.suffixes[-2] == ".tar"
+    )
+
+
+def iter_tar_file_pages(tar_path: Path) -> Iterator[tuple[str, str]]:
+    """Return titles and bodies of the page files in a tar file saved by
+    `save_pages_to_file()`."""
+    with (
+        tar_path.open("rb")
+        if tar_path.suffix == ".tar"
+        else decompress_dump_file(str(tar_path))
+    ) as p:
+        with tarfile.open(
+            fileobj=p.stdout if isinstance(p, subprocess.Popen) else p,
+            mode="r|",
+        ) as tar:
+            for tar_info in tar:
+                f = tar.extractfile(tar_info)
+                if f is None:
+                    continue
+                first_line, _, body = f.read().decode("utf-8").partition("\n")
+                if not first_line.startswith("TITLE: "):
+                    logger.warning(
+                        f"{tar_info.name} in {tar_path} doesn't start with "
+                        '"TITLE: <page title>"'
+                    )
+                    continue
+                yield first_line[7:].strip(), body
 
 
 # XXX parse <namespaces> and use that in both Python and Lua code
@@ -275,7 +275,10 @@ end
 function mw_title.new(text, namespace)
     if text == nil then return nil end
     if type(text) == "number" then
-        error("XXX mw.title.new with id not yet implemented")
+        -- page id, returns nil if the page doesn't exist
+        local title = mw_python_get_page_title_by_id(text)
+        if title == nil then return nil end
+        return mw_title.new(title)
     end
     assert(type(text) == "string")
     if not namespace then namespace = "Main" end
@@ -60,6 +60,9 @@ def lua_loader(ctx: "Wtp", modname: str) -> Optional[str]:
     # print("LUA_LOADER IN PYTHON:", modname)
     assert isinstance(modname, str)
     modname = modname.strip()
+    if ctx.read_only and modname == "_sandbox_phase1":
+        # `add_empty_sandbox_lua_module()` can't save the empty module
+        return ""
     data = ctx.get_page_body(modname, ctx.NAMESPACE_DATA["Module"]["id"])
     if data is None:
         # Try to load it from a file
@@ -189,17 +192,23 @@ def get_page_info(ctx: "Wtp", title: str, namespace_id: int) -> "_LuaTable":
     titles."""
     assert ctx.lua is not None
 
-    page_id = 0  # XXX collect required info in phase 1
     page = ctx.get_page(title, namespace_id)
-    # whether the page exists and what its id might be
+    # whether the page exists and its id in the dump file, MediaWiki uses 0
+    # for pages that don't exist
     dt = {
-        "id": page_id,
+        "id": (page.page_id or 0) if page is not None else 0,
         "exists": page is not None,
         "redirectTo": page.redirect_to if page is not None else None,
     }
     return ctx.lua.table_from(dt)
 
 
+def get_page_title_by_id(ctx: "Wtp", page_id: int) -> Optional[str]:
+    """Return the title of a page id, used by `mw.title.new(id)`."""
+    page = ctx.get_page_by_id(int(page_id))
+    return page.title if page is not None else None
+
+
 def fetch_language_name(code: str, in_language: str) -> str:
     """
     This function is called from Lua code as part of the mw.language
@@ -264,6 +273,9 @@ def call_set_functions(
                 "mw_jsondecode_python": partial(mw_text_jsondecode, ctx),
                 "mw_python_get_page_info": partial(get_page_info, ctx),
                 "mw_python_get_page_content": partial(get_page_content, ctx),
+                "mw_python_get_page_title_by_id": partial(
+                    get_page_title_by_id, ctx
+                ),
                 "mw_python_fetch_language_name": fetch_language_name,
                 "mw_python_fetch_language_names": partial(
                     fetch_language_names, ctx
@@ -803,6 +815,8 @@ def get_current_title(wtp: "Wtp") -> str:
 
 def add_empty_sandbox_lua_module(wtp: "Wtp") -> None:
     # prevent untrusted Lua code run sandbox
+    if wtp.read_only:
+        return
     ns = wtp.NAMESPACE_DATA["Module"]
     ns_name = ns["name"]
     ns_id = ns["id"]
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# Default sizes of the template and module pool and the pool of other pages
+TEMPLATE_CACHE_BYTES = 256 * 1024 * 1024
+PAGE_CACHE_BYTES = 32 * 1024 * 1024
+# Rough memory used by a cache entry besides the page strings
+ENTRY_OVERHEAD_BYTES = 200
+# Normalized titles are saved to skip namespace prefix checks of cached pages
+MAX_NORMALIZED_TITLES = 100000
+MAX_REDIRECT_TARGETS = 100000
+
+
+@dataclass
+class CachePool:
+    """Least recently used entries are removed when the total size of the
+    entries is larger than `max_bytes`."""
+
+    max_bytes: int
+    entries: OrderedDict[Hashable, tuple[Any, int]] = field(
+        default_factory=OrderedDict
+    )
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+
+    def get(self, key: Hashable) -> Optional[tuple[Any, int]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, removed_size) = self.entries.popitem(last=False)
+            self.size -= removed_size
+
+    def pop(self, key: Hashable) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+
+class PageCache:
+    """Per `Wtp` object cache of database query results, pages of template
+    and module namespaces are saved in a separate pool so that they are not
+    removed by reading many other pages.
+
+    Keys are `(title_key, namespace_id)` tuples, `add_page()` and other
+    methods that change pages remove the keys of changed titles."""
+
+    __slots__ = (
+        "template_pool",
+        "page_pool",
+        "template_namespace_ids",
+        "normalized_titles",
+        "redirect_targets",
+    )
+
+    def __init__(
+        self,
+        template_namespace_ids: set[int],
+        template_max_bytes: int,
+        page_max_bytes: int,
+    ):
+        self.template_namespace_ids = template_namespace_ids
+        self.template_pool = CachePool(template_max_bytes)
+        self.page_pool = CachePool(page_max_bytes)
+        # `get_page()` arguments -> (canonical title, title key)
+        self.normalized_titles: dict[
+            tuple[str, Optional[int]], tuple[str, str]
+        ] = {}
+        # (title, namespace id) of redirect page -> (title, namespace id) of
+        # the saved last page in the redirect chain
+        self.redirect_targets: dict[tuple[str, int], tuple[str, int]] = {}
+
+    def save_normalized_title(
+        self,
+        args: tuple[str, Optional[int]],
+        normalized_title: tuple[str, str],
+    ) -> None:
+        if len(self.normalized_titles) >= MAX_NORMALIZED_TITLES:
+            self.normalized_titles.clear()
+        self.normalized_titles[args] = normalized_title
+
+    def save_redirect_target(
+        self, page: tuple[str, int], target: tuple[str, int]
+    ) -> None:
+        if len(self.redirect_targets) >= MAX_REDIRECT_TARGETS:
+            self.redirect_targets.clear()
+        self.redirect_targets[page] = target
+
+    def pool(self, namespace_id: Optional[int]) -> CachePool:
+        if namespace_id in self.template_namespace_ids:
+            return self.template_pool
+        return self.page_pool
+
+    def get(self, key: tuple[str, Optional[int]]) -> Optional[Any]:
+        entry = self.pool(key[1]).get(key)
+        return None if entry is None else entry[0]
+
+    def put(
+        self, key: tuple[str, Optional[int]], value: Any, size: int
+    ) -> None:
+        self.pool(key[1]).put(key, value, size + ENTRY_OVERHEAD_BYTES)
+
+    def invalidate(self, key: tuple[str, Optional[int]]) -> None:
+        self.pool(key[1]).pop(key)
+
+    def clear(self) -> None:
+        self.template_pool.clear()
+        self.page_pool.clear()
+        self.redirect_targets.clear()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {
+            name: {
+                "entries": len(pool.entries),
+                "bytes": pool.size,
+                "max_bytes": pool.max_bytes,
+                "hits": pool.hits,
+                "misses": pool.misses,
+            }
+            for name, pool in (
+                ("template", self.template_pool),
+                ("page", self.page_pool),
+            )
+        }
@@ -0,0 +1,1494 @@
+import mmap
+import re
+import sqlite3
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+from .logging_utils import logger
+
+# title, namespace_id, redirect_to, need_pre_expand, body, model, page_id
+PageRow = tuple
+# title, namespace_id, body, redirect_to, need_pre_expand, model,
+# revision_id, sha1, page_id, title_key
+SavePageRow = tuple
+# redirect page title -> (target title key, target namespace id, target rows)
+RedirectTargetRows = dict[str, tuple[str, int, list[PageRow]]]
+DecompressBody = Callable[[Optional[Union[str, bytes]]], Optional[str]]
+
+READ_ONLY_MMAP_SIZE = 1 << 40
+# Database page size set by `optimize()`, fewer overflow pages are used to
+# save page bodies larger than the default 4096 bytes page size
+OPTIMIZED_PAGE_SIZE = 16384
+# Rows read from SQLite cursor at a time in `iter_pages()`
+ITER_PAGES_BATCH_SIZE = 1000
+
+
+def shard_range(
+    start: int, stop: int, shard: int, num_shards: int
+) -> tuple[int, int]:
+    """Split `range(start, stop)` to `num_shards` continuous ranges, return
+    the start and stop of the range at index `shard`."""
+    length = stop - start
+    return (
+        start + length * shard // num_shards,
+        start + length * (shard + 1) // num_shards,
+    )
+
+
+class PageStore(ABC):
+    """Storage of the `pages` data used by `Wtp`. Other data like analyzed
+    template uses and Wikidata cache are always saved in the SQLite
+    database.
+
+    Page bodies are passed to the store in the saved form, they are
+    compressed by `Wtp.compress_body()` if `decompress_body` is not `None`,
+    it is used to search page text."""
+
+    def __init__(
+        self,
+        db_conn: sqlite3.Connection,
+        decompress_body: Optional[DecompressBody] = None,
+        db_path: Optional[Path] = None,
+    ):
+        self.db_conn = db_conn
+        self.decompress_body = decompress_body
+        self.db_path = db_path
+
+    def close(self) -> None:
+        pass
+
+    def create_search_index(self) -> None:
+        """Create index used by `search_pattern` arguments if the store
+        supports it."""
+
+    def optimize(self, page_size: int = OPTIMIZED_PAGE_SIZE) -> None:
+        """Reorganize saved pages for faster reading after all pages are
+        saved."""
+
+    @abstractmethod
+    def get_pages(self, title_key: str, namespace_id: int) -> list[PageRow]: ...
+
+    def get_pages_and_redirect_targets(
+        self, title_key: str, namespace_id: int
+    ) -> tuple[list[PageRow], RedirectTargetRows]:
+        """Return `get_pages()` result and the rows of the saved last pages
+        of redirect chains, stores not saving redirect targets return an
+        empty dictionary."""
+        return self.get_pages(title_key, namespace_id), {}
+
+    def save_redirect_targets(
+        self, targets: Iterable[tuple[str, int, str, int]]
+    ) -> None:
+        """Save title key and namespace id of the last page in the redirect
+        chain, arguments are target title key, target namespace id, title
+        and namespace id of the redirect page."""
+
+    @abstractmethod
+    def get_pages_by_title(self, title: str) -> list[PageRow]: ...
+
+    @abstractmethod
+    def get_page_by_id(self, page_id: int) -> Optional[PageRow]: ...
+
+    @abstractmethod
+    def get_sha1(
+        self, title: str, namespace_id: Optional[int]
+    ) -> Optional[str]:
+        """Return the SHA-1 of the saved page revision."""
+
+    @abstractmethod
+    def get_redirect_to(
+        self, title: str, namespace_id: int
+    ) -> list[Optional[str]]:
+        """Return the `redirect_to` value of the saved page in a list, the
+        list is empty if the page is not saved."""
+
+    @abstractmethod
+    def save_page(self, row: SavePageRow) -> bool:
+        """Insert or update the page, the page is not changed if the saved
+        page has the same SHA-1 value, returns `False` in this case."""
+
+    def save_bulk_load_pages(self, rows: list[SavePageRow]) -> None:
+        for row in rows:
+            self.save_page(row)
+
+    @contextmanager
+    def bulk_load(self, resumable: bool = False) -> Iterator[None]:
+        yield
+
+    @abstractmethod
+    def delete_page(self, title: str, namespace_id: int) -> None: ...
+
+    @abstractmethod
+    def iter_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        include_body: bool = True,
+        shard: int = 0,
+        num_shards: int = 1,
+    ) -> Iterator[PageRow]:
+        """Body of the yielded rows is `None` if `include_body` is `False`.
+        Pages are split to `num_shards` parts by row id or saved order,
+        only pages of the part at index `shard` are returned."""
+
+    @abstractmethod
+    def count_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+    ) -> int: ...
+
+    @abstractmethod
+    def has_pages(self) -> bool: ...
+
+    @abstractmethod
+    def iter_title_keys(self) -> Iterator[tuple[str, int]]: ...
+
+    @abstractmethod
+    def has_need_pre_expand_pages(self) -> bool: ...
+
+    @abstractmethod
+    def need_pre_expand_titles(self, namespace_id: int) -> list[str]: ...
+
+    @abstractmethod
+    def set_need_pre_expand(self, title: str) -> None: ...
+
+    @abstractmethod
+    def clear_need_pre_expand(
+        self, titles: Iterable[str], namespace_id: int
+    ) -> None: ...
+
+    @abstractmethod
+    def clear_redirect_need_pre_expand(self, namespace_id: int) -> None: ...
+
+    @abstractmethod
+    def propagate_redirect_need_pre_expand(self) -> None:
+        """Set `need_pre_expand` of redirect pages and redirect targets if
+        the other page needs pre-expand."""
+
+
+class SQLitePageStore(PageStore):
+    """Pages are saved in the `pages` table of the database file."""
+
+    def __init__(
+        self,
+        db_conn: sqlite3.Connection,
+        decompress_body: Optional[DecompressBody] = None,
+        db_path: Optional[Path] = None,
+    ):
+        super().__init__(db_conn, decompress_body, db_path)
+        if decompress_body is not None:
+            # used by SQL queries that search page text
+            db_conn.create_function(
+                "decompress_body", 1, decompress_body, deterministic=True
+            )
+        # `search_pattern` uses the trigram full-text index if it exists
+        self.has_search_index = (
+            db_conn.execute(
+                "SELECT 1 FROM sqlite_schema WHERE name = 'pages_fts'"
+            ).fetchone()
+            is not None
+        )
+
+    def body_sql(self, column: str = "body") -> str:
+        if self.decompress_body is not None:
+            return f"decompress_body({column})"
+        return column
+
+    def create_search_index(self) -> None:
+        if self.has_search_index:
+            return
+        logger.info("Creating full-text search index of page bodies")
+        self.db_conn.executescript(
+            f"""
+        CREATE VIRTUAL TABLE pages_fts USING fts5(body, tokenize='trigram');
+        INSERT INTO pages_fts(rowid, body)
+        SELECT rowid, {self.body_sql()} FROM pages WHERE body IS NOT NULL;
+        """
+        )
+        self.db_conn.commit()
+        self.has_search_index = True
+
+    def optimize(self, page_size: int = OPTIMIZED_PAGE_SIZE) -> None:
+        """Copy pages to a new table sorted by namespace id and title, so
+        pages of the same namespace are next to each other in the database
+        file, then rebuild the file with `page_size`. Row ids are changed,
+        the search index is created again."""
+        has_search_index = self.has_search_index
+        (table_sql,) = self.db_conn.execute(
+            """SELECT sql FROM sqlite_schema
+            WHERE type = 'table' AND name = 'pages'"""
+        ).fetchone()
+        index_sqls = [
+            index_sql
+            for (index_sql,) in self.db_conn.execute(
+                """SELECT sql FROM sqlite_schema
+                WHERE type = 'index' AND tbl_name = 'pages'
+                AND sql IS NOT NULL"""
+            )
+        ]
+        columns = ", ".join(
+            column[1]
+            for column in self.db_conn.execute("PRAGMA table_info(pages)")
+        )
+        logger.info("Sorting pages by namespace and title")
+        self.db_conn.commit()
+        self.db_conn.executescript(
+            f"""
+        BEGIN;
+        DROP TABLE IF EXISTS pages_fts;
+        {table_sql.replace("pages", "sorted_pages", 1)};
+        INSERT INTO sorted_pages ({columns})
+        SELECT {columns} FROM pages ORDER BY namespace_id, title;
+        DROP TABLE pages;
+        ALTER TABLE sorted_pages RENAME TO pages;
+        {";".join(index_sqls)};
+        COMMIT;
+        """
+        )
+        self.has_search_index = False
+        logger.info(f"Rebuilding database file with page size {page_size}")
+        (journal_mode,) = self.db_conn.execute("PRAGMA journal_mode").fetchone()
+        # page size of WAL mode database can't be changed
+        self.db_conn.executescript(
+            f"""
+        PRAGMA journal_mode = DELETE;
+        PRAGMA page_size = {int(page_size)};
+        VACUUM;
+        PRAGMA journal_mode = {journal_mode};
+        """
+        )
+        if has_search_index:
+            self.create_search_index()
+
+    def update_search_index(
+        self, rowid: int, body: Optional[Union[str, bytes]]
+    ) -> None:
+        self.db_conn.execute("DELETE FROM pages_fts WHERE rowid = ?", (rowid,))
+        if self.decompress_body is not None:
+            body = self.decompress_body(body)
+        if body is not None:
+            self.db_conn.execute(
+                "INSERT INTO pages_fts(rowid, body) VALUES(?, ?)",
+                (rowid, body),
+            )
+
+    def get_pages(self, title_key: str, namespace_id: int) -> list[PageRow]:
+        return self.db_conn.execute(
+            """
+        SELECT title, namespace_id, redirect_to, need_pre_expand, body, model,
+        page_id
+        FROM pages
+        WHERE title_key = ? AND namespace_id = ?
+        """,
+            (title_key, namespace_id),
+        ).fetchall()
+
+    def get_pages_and_redirect_targets(
+        self, title_key: str, namespace_id: int
+    ) -> tuple[list[PageRow], RedirectTargetRows]:
+        pages: dict[str, PageRow] = {}
+        targets: RedirectTargetRows = {}
+        for row in self.db_conn.execute(
+            """
+        SELECT p.title, p.namespace_id, p.redirect_to, p.need_pre_expand,
+        p.body, p.model, p.page_id, p.redirect_key, p.redirect_namespace_id,
+        t.title, t.namespace_id, t.redirect_to, t.need_pre_expand, t.body,
+        t.model, t.page_id
+        FROM pages AS p LEFT JOIN pages AS t
+        ON t.title_key = p.redirect_key
+        AND t.namespace_id = p.redirect_namespace_id
+        WHERE p.title_key = ? AND p.namespace_id = ?
+        """,
+            (title_key, namespace_id),
+        ):
+            pages[row[0]] = row[:7]
+            if row[7] is not None:
+                target_rows = targets.setdefault(row[0], (row[7], row[8], []))[
+                    2
+                ]
+                if row[9] is not None:
+                    target_rows.append(row[9:])
+        return list(pages.values()), targets
+
+    def save_redirect_targets(
+        self, targets: Iterable[tuple[str, int, str, int]]
+    ) -> None:
+        self.db_conn.executemany(
+            """UPDATE pages SET redirect_key = ?, redirect_namespace_id = ?
+            WHERE title = ? AND namespace_id = ?""",
+            targets,
+        )
+
+    def get_pages_by_title(self, title: str) -> list[PageRow]:
+        return self.db_conn.execute(
+            """
+        SELECT title, namespace_id, redirect_to, need_pre_expand, body, model,
+        page_id
+        FROM pages
+        WHERE title = ?
+        """,
+            (title,),
+        ).fetchall()
+
+    def get_page_by_id(self, page_id: int) -> Optional[PageRow]:
+        return self.db_conn.execute(
+            """
+        SELECT title, namespace_id, redirect_to, need_pre_expand, body, model,
+        page_id
+        FROM pages
+        WHERE page_id = ?
+        LIMIT 1
+        """,
+            (page_id,),
+        ).fetchone()
+
+    def get_sha1(
+        self, title: str, namespace_id: Optional[int]
+    ) -> Optional[str]:
+        for (sha1,) in self.db_conn.execute(
+            "SELECT sha1 FROM pages WHERE title = ? AND namespace_id = ?",
+            (title, namespace_id),
+        ):
+            return sha1
+        return None
+
+    def get_redirect_to(
+        self, title: str, namespace_id: int
+    ) -> list[Optional[str]]:
+        return [
+            redirect_to
+            for (redirect_to,) in self.db_conn.execute(
+                """SELECT redirect_to FROM pages
+                WHERE title = ? AND namespace_id = ?""",
+                (title, namespace_id),
+            )
+        ]
+
+    def save_page(self, row: SavePageRow) -> bool:
+        result = self.db_conn.execute(
+            """INSERT INTO pages (title, namespace_id, body,
+        redirect_to, need_pre_expand, model, revision_id, sha1, page_id,
+        title_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(title, namespace_id) DO UPDATE SET
+        body=excluded.body, redirect_to=excluded.redirect_to,
+        need_pre_expand=excluded.need_pre_expand, model=excluded.model,
+        revision_id=excluded.revision_id, sha1=excluded.sha1,
+        page_id=excluded.page_id, redirect_key=NULL,
+        redirect_namespace_id=NULL
+        WHERE excluded.sha1 IS NULL OR pages.sha1 IS NOT excluded.sha1
+        RETURNING rowid""",
+            row,
+        ).fetchone()
+        if result is None:
+            return False
+        if self.has_search_index:
+            self.update_search_index(result[0], row[2])
+        return True
+
+    def save_bulk_load_pages(self, rows: list[SavePageRow]) -> None:
+        self.db_conn.executemany(
+            """INSERT INTO bulk_load_pages (title, namespace_id, body,
+        redirect_to, need_pre_expand, model, revision_id, sha1, page_id,
+        title_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+
+    @contextmanager
+    def bulk_load(self, resumable: bool = False) -> Iterator[None]:
+        """Pages are inserted to a table without index and journal, then
+        copied to the `pages` table sorted by primary key at the end."""
+        (journal_mode,) = self.db_conn.execute("PRAGMA journal_mode").fetchone()
+        (synchronous,) = self.db_conn.execute("PRAGMA synchronous").fetchone()
+        (cache_size,) = self.db_conn.execute("PRAGMA cache_size").fetchone()
+        if resumable:
+            self.db_conn.execute("PRAGMA synchronous = NORMAL")
+        else:
+            self.db_conn.executescript(
+                """
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            DROP TABLE IF EXISTS bulk_load_pages;
+            """
+            )
+        self.db_conn.executescript(
+            """
+        PRAGMA cache_size = -262144;
+        CREATE TABLE IF NOT EXISTS bulk_load_pages AS
+        SELECT * FROM pages WHERE 0;
+        """
+        )
+        try:
+            yield
+            if self.has_search_index:
+                self.db_conn.execute(
+                    """DELETE FROM pages_fts WHERE rowid IN
+                (SELECT pages.rowid FROM bulk_load_pages
+                JOIN pages USING (title, namespace_id))"""
+                )
+            logger.info("Copying bulk loaded pages to the pages table")
+            self.db_conn.execute(
+                """
+            INSERT INTO pages (title, namespace_id, body, redirect_to,
+            need_pre_expand, model, revision_id, sha1, page_id, title_key)
+            SELECT title, namespace_id, body, redirect_to, need_pre_expand,
+            model, revision_id, sha1, page_id, title_key
+            FROM bulk_load_pages WHERE true
+            ORDER BY title, namespace_id, rowid
+            ON CONFLICT(title, namespace_id) DO UPDATE SET
+            body=excluded.body, redirect_to=excluded.redirect_to,
+            need_pre_expand=excluded.need_pre_expand, model=excluded.model,
+            revision_id=excluded.revision_id, sha1=excluded.sha1,
+            page_id=excluded.page_id, redirect_key=NULL,
+            redirect_namespace_id=NULL
+            """
+            )
+            if self.has_search_index:
+                self.db_conn.execute(
+                    f"""INSERT INTO pages_fts(rowid, body)
+                SELECT pages.rowid, {self.body_sql("pages.body")}
+                FROM bulk_load_pages JOIN pages USING (title, namespace_id)
+                WHERE pages.body IS NOT NULL"""
+                )
+            self.db_conn.execute("DROP TABLE bulk_load_pages")
+        except BaseException:
+            if resumable:
+                # keep the rows committed with the last checkpoint
+                self.db_conn.rollback()
+            else:
+                self.db_conn.execute("DROP TABLE IF EXISTS bulk_load_pages")
+            raise
+        finally:
+            self.db_conn.commit()
+            self.db_conn.executescript(
+                f"""
+            PRAGMA journal_mode = {journal_mode};
+            PRAGMA synchronous = {synchronous};
+            PRAGMA cache_size = {cache_size};
+            """
+            )
+
+    def delete_page(self, title: str, namespace_id: int) -> None:
+        for (rowid,) in self.db_conn.execute(
+            """DELETE FROM pages WHERE title = ? AND namespace_id = ?
+            RETURNING rowid""",
+            (title, namespace_id),
+        ).fetchall():
+            if self.has_search_index:
+                self.db_conn.execute(
+                    "DELETE FROM pages_fts WHERE rowid = ?", (rowid,)
+                )
+
+    def build_sql_where_query(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        rowid_range: Optional[tuple[int, int]] = None,
+    ) -> tuple[str, tuple[Union[str, int], ...]]:
+        and_strs = []
+        where_str = ""
+        query_values: list[Union[int, str]] = []
+        if namespace_ids is not None:
+            and_strs.append(
+                f"namespace_id IN ({','.join('?' * len(namespace_ids))})"
+            )
+            query_values.extend(namespace_ids)
+        if not include_redirects:
+            and_strs.append("redirect_to IS NULL")
+        if search_pattern:
+            if self.has_search_index:
+                and_strs.append(
+                    "rowid IN (SELECT rowid FROM pages_fts WHERE body LIKE ?)"
+                )
+            else:
+                and_strs.append(f"{self.body_sql()} LIKE ?")
+            query_values.append(search_pattern)
+        if model is not None:
+            and_strs.append("model = ?")
+            query_values.append(model)
+        if rowid_range is not None:
+            and_strs.append("rowid >= ? AND rowid < ?")
+            query_values.extend(rowid_range)
+
+        if len(and_strs) > 0:
+            where_str = " WHERE " + " AND ".join(and_strs)
+
+        return where_str, tuple(query_values)
+
+    def iter_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        include_body: bool = True,
+        shard: int = 0,
+        num_shards: int = 1,
+    ) -> Iterator[PageRow]:
+        rowid_range = None
+        if num_shards > 1:
+            min_rowid, max_rowid = self.db_conn.execute(
+                "SELECT min(rowid), max(rowid) FROM pages"
+            ).fetchone()
+            if min_rowid is None:
+                return
+            rowid_range = shard_range(
+                min_rowid, max_rowid + 1, shard, num_shards
+            )
+        query_str = f"""
+        SELECT title, namespace_id, redirect_to, need_pre_expand,
+        {"body" if include_body else "NULL"}, model, page_id
+        FROM pages
+        """
+        where_str, query_values = self.build_sql_where_query(
+            namespace_ids, include_redirects, model, search_pattern, rowid_range
+        )
+        cursor = self.db_conn.execute(query_str + where_str, query_values)
+        while rows := cursor.fetchmany(ITER_PAGES_BATCH_SIZE):
+            yield from rows
+
+    def count_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+    ) -> int:
+        where_str, query_values = self.build_sql_where_query(
+            namespace_ids, include_redirects, model, search_pattern
+        )
+        for result in self.db_conn.execute(
+            "SELECT count(*) FROM pages" + where_str, query_values
+        ):
+            return result[0]
+        return 0
+
+    def has_pages(self) -> bool:
+        for (result,) in self.db_conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM pages)"
+        ):
+            return result == 1
+        return False
+
+    def iter_title_keys(self) -> Iterator[tuple[str, int]]:
+        yield from self.db_conn.execute(
+            "SELECT title_key, namespace_id FROM pages"
+        )
+
+    def has_need_pre_expand_pages(self) -> bool:
+        for (result,) in self.db_conn.execute(
+            "SELECT count(*) > 0 FROM pages WHERE need_pre_expand = 1"
+        ):
+            return result == 1
+        return False
+
+    def need_pre_expand_titles(self, namespace_id: int) -> list[str]:
+        return [
+            title
+            for (title,) in self.db_conn.execute(
+                """SELECT title FROM pages
+                WHERE namespace_id = ? AND need_pre_expand = 1""",
+                (namespace_id,),
+            )
+        ]
+
+    def set_need_pre_expand(self, title: str) -> None:
+        self.db_conn.execute(
+            "UPDATE pages SET need_pre_expand = 1 WHERE title = ?", (title,)
+        )
+
+    def clear_need_pre_expand(
+        self, titles: Iterable[str], namespace_id: int
+    ) -> None:
+        self.db_conn.executemany(
+            """UPDATE pages SET need_pre_expand = 0
+            WHERE title = ? AND namespace_id = ?""",
+            ((title, namespace_id) for title in titles),
+        )
+
+    def clear_redirect_need_pre_expand(self, namespace_id: int) -> None:
+        self.db_conn.execute(
+            """UPDATE pages SET need_pre_expand = 0
+            WHERE namespace_id = ? AND redirect_to IS NOT NULL""",
+            (namespace_id,),
+        )
+
+    def propagate_redirect_need_pre_expand(self) -> None:
+        # redirected source templates
+        self.db_conn.execute(
+            """
+        UPDATE pages SET need_pre_expand = 1
+        FROM pages AS dest
+        WHERE pages.redirect_to = dest.title
+        AND pages.namespace_id = dest.namespace_id
+        AND dest.need_pre_expand = 1
+        AND pages.need_pre_expand = 0
+        """
+        )
+        # redirected destination pages
+        self.db_conn.execute(
+            """
+        UPDATE pages SET need_pre_expand = 1
+        FROM pages AS source
+        WHERE pages.title = source.redirect_to
+        AND pages.namespace_id = source.namespace_id
+        AND source.need_pre_expand = 1
+        AND pages.need_pre_expand = 0
+        """
+        )
+
+
+class MmapPageStore(SQLitePageStore):
+    """SQLite store that reads the database file through memory-mapped I/O
+    instead of the page cache, used by read-only worker processes."""
+
+    def __init__(
+        self,
+        db_conn: sqlite3.Connection,
+        decompress_body: Optional[DecompressBody] = None,
+        db_path: Optional[Path] = None,
+    ):
+        super().__init__(db_conn, decompress_body, db_path)
+        # SQLite limits the size to SQLITE_MAX_MMAP_SIZE
+        db_conn.execute(f"PRAGMA mmap_size = {READ_ONLY_MMAP_SIZE}")
+
+
+def without_body(row: PageRow) -> PageRow:
+    return row[:4] + (None,) + row[5:]
+
+
+def like_pattern_to_re(pattern: str) -> re.Pattern:
+    """Convert SQL LIKE pattern to regex, LIKE is case-insensitive for
+    ASCII characters."""
+    re_str = "".join(
+        ".*" if char == "%" else "." if char == "_" else re.escape(char)
+        for char in pattern
+    )
+    return re.compile(re_str, re.ASCII | re.IGNORECASE | re.DOTALL)
+
+
+class MemoryPageStore(PageStore):
+    """Pages are saved in Python dictionaries and are not saved to the
+    database file, mainly used in tests."""
+
+    def __init__(
+        self,
+        db_conn: sqlite3.Connection,
+        decompress_body: Optional[DecompressBody] = None,
+        db_path: Optional[Path] = None,
+    ):
+        super().__init__(db_conn, decompress_body, db_path)
+        # (title, namespace_id) -> list of `SavePageRow` values
+        self.pages: dict[tuple[str, Optional[int]], list] = {}
+        self.title_keys: dict[
+            tuple[str, Optional[int]], list[tuple[str, Optional[int]]]
+        ] = {}
+
+    @staticmethod
+    def page_row(row: list) -> PageRow:
+        return (row[0], row[1], row[3], int(row[4]), row[2], row[5], row[8])
+
+    def get_pages(self, title_key: str, namespace_id: int) -> list[PageRow]:
+        return [
+            self.page_row(self.pages[key])
+            for key in self.title_keys.get((title_key, namespace_id), [])
+        ]
+
+    def get_pages_by_title(self, title: str) -> list[PageRow]:
+        return sorted(
+            (
+                self.page_row(row)
+                for (row_title, _), row in self.pages.items()
+                if row_title == title
+            ),
+            key=lambda row: row[1],
+        )
+
+    def get_page_by_id(self, page_id: int) -> Optional[PageRow]:
+        for row in self.pages.values():
+            if row[8] == page_id:
+                return self.page_row(row)
+        return None
+
+    def get_sha1(
+        self, title: str, namespace_id: Optional[int]
+    ) -> Optional[str]:
+        row = self.pages.get((title, namespace_id))
+        return None if row is None else row[7]
+
+    def get_redirect_to(
+        self, title: str, namespace_id: int
+    ) -> list[Optional[str]]:
+        row = self.pages.get((title, namespace_id))
+        return [] if row is None else [row[3]]
+
+    def save_page(self, row: SavePageRow) -> bool:
+        key = (row[0], row[1])
+        saved_row = self.pages.get(key)
+        if saved_row is None:
+            self.pages[key] = list(row)
+            self.title_keys.setdefault((row[9], row[1]), []).append(key)
+            return True
+        if row[7] is not None and saved_row[7] == row[7]:
+            return False
+        # title key is not changed
+        saved_row[2:9] = row[2:9]
+        return True
+
+    def delete_page(self, title: str, namespace_id: int) -> None:
+        row = self.pages.pop((title, namespace_id), None)
+        if row is not None:
+            self.title_keys[(row[9], namespace_id)].remove(
+                (title, namespace_id)
+            )
+
+    def iter_rows(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        shard: int = 0,
+        num_shards: int = 1,
+    ) -> Iterator[list]:
+        search_re = (
+            like_pattern_to_re(search_pattern) if search_pattern else None
+        )
+        rows = list(self.pages.values())
+        start, stop = shard_range(0, len(rows), shard, num_shards)
+        for row in rows[start:stop]:
+            if (
+                (namespace_ids is None or row[1] in namespace_ids)
+                and (include_redirects or row[3] is None)
+                and (model is None or row[5] == model)
+                and (search_re is None or search_re.fullmatch(self.body(row)))
+            ):
+                yield row
+
+    def body(self, row: list) -> str:
+        if self.decompress_body is not None:
+            return self.decompress_body(row[2]) or ""
+        return row[2] or ""
+
+    def iter_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        include_body: bool = True,
+        shard: int = 0,
+        num_shards: int = 1,
+    ) -> Iterator[PageRow]:
+        for row in self.iter_rows(
+            namespace_ids,
+            include_redirects,
+            model,
+            search_pattern,
+            shard,
+            num_shards,
+        ):
+            page_row = self.page_row(row)
+            yield page_row if include_body else without_body(page_row)
+
+    def count_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+    ) -> int:
+        return sum(
+            1
+            for _ in self.iter_rows(
+                namespace_ids, include_redirects, model, search_pattern
+            )
+        )
+
+    def has_pages(self) -> bool:
+        return len(self.pages) > 0
+
+    def iter_title_keys(self) -> Iterator[tuple[str, int]]:
+        for row in self.pages.values():
+            yield row[9], row[1]
+
+    def has_need_pre_expand_pages(self) -> bool:
+        return any(row[4] for row in self.pages.values())
+
+    def need_pre_expand_titles(self, namespace_id: int) -> list[str]:
+        return [
+            row[0]
+            for row in self.pages.values()
+            if row[1] == namespace_id and row[4]
+        ]
+
+    def set_need_pre_expand(self, title: str) -> None:
+        for row in self.pages.values():
+            if row[0] == title:
+                row[4] = True
+
+    def clear_need_pre_expand(
+        self, titles: Iterable[str], namespace_id: int
+    ) -> None:
+        for title in titles:
+            row = self.pages.get((title, namespace_id))
+            if row is not None:
+                row[4] = False
+
+    def clear_redirect_need_pre_expand(self, namespace_id: int) -> None:
+        for row in self.pages.values():
+            if row[1] == namespace_id and row[3] is not None:
+                row[4] = False
+
+    def propagate_redirect_need_pre_expand(self) -> None:
+        # redirected source templates
+        for row in [
+            row
+            for row in self.pages.values()
+            if row[3] is not None
+            and not row[4]
+            and (dest := self.pages.get((row[3], row[1]))) is not None
+            and dest[4]
+        ]:
+            row[4] = True
+        # redirected destination pages
+        for row in [
+            dest
+            for row in self.pages.values()
+            if row[3] is not None
+            and row[4]
+            and (dest := self.pages.get((row[3], row[1]))) is not None
+            and not dest[4]
+        ]:
+            row[4] = True
+
+
+class PreloadPageStore(PageStore):
+    """Pages of the given namespaces are loaded from another store to a
+    dictionary, their title lookups don't read the database. Other methods
+    use the other store, changed pages are also updated in the dictionary.
+    """
+
+    def __init__(
+        self,
+        store: PageStore,
+        namespace_ids: set[int],
+        title_key: Callable[[str, Optional[int]], str],
+    ):
+        super().__init__(store.db_conn, store.decompress_body, store.db_path)
+        self.store = store
+        self.namespace_ids = namespace_ids
+        self.title_key = title_key
+        self.pages: dict[tuple[str, int], list[PageRow]] = {}
+        self.load_pages()
+
+    def load_pages(self) -> None:
+        self.pages.clear()
+        for row in self.store.iter_pages(list(self.namespace_ids)):
+            self.add_row(row)
+        logger.info(f"Loaded {len(self.pages)} pages to memory")
+
+    def add_row(self, row: PageRow) -> None:
+        key = (self.title_key(row[0], row[1]), row[1])
+        rows = [r for r in self.pages.get(key, []) if r[0] != row[0]]
+        rows.append(row)
+        self.pages[key] = rows
+
+    def remove_row(self, title: str, namespace_id: int) -> None:
+        key = (self.title_key(title, namespace_id), namespace_id)
+        if key in self.pages:
+            self.pages[key] = [r for r in self.pages[key] if r[0] != title]
+
+    def close(self) -> None:
+        self.store.close()
+
+    def create_search_index(self) -> None:
+        self.store.create_search_index()
+
+    def optimize(self, page_size: int = OPTIMIZED_PAGE_SIZE) -> None:
+        self.store.optimize(page_size)
+
+    def get_pages(self, title_key: str, namespace_id: int) -> list[PageRow]:
+        if namespace_id in self.namespace_ids:
+            return self.pages.get((title_key, namespace_id), [])
+        return self.store.get_pages(title_key, namespace_id)
+
+    def get_pages_and_redirect_targets(
+        self, title_key: str, namespace_id: int
+    ) -> tuple[list[PageRow], RedirectTargetRows]:
+        if namespace_id in self.namespace_ids:
+            return self.pages.get((title_key, namespace_id), []), {}
+        return self.store.get_pages_and_redirect_targets(
+            title_key, namespace_id
+        )
+
+    def save_redirect_targets(
+        self, targets: Iterable[tuple[str, int, str, int]]
+    ) -> None:
+        self.store.save_redirect_targets(targets)
+
+    def get_pages_by_title(self, title: str) -> list[PageRow]:
+        return self.store.get_pages_by_title(title)
+
+    def get_page_by_id(self, page_id: int) -> Optional[PageRow]:
+        return self.store.get_page_by_id(page_id)
+
+    def get_sha1(
+        self, title: str, namespace_id: Optional[int]
+    ) -> Optional[str]:
+        return self.store.get_sha1(title, namespace_id)
+
+    def get_redirect_to(
+        self, title: str, namespace_id: int
+    ) -> list[Optional[str]]:
+        return self.store.get_redirect_to(title, namespace_id)
+
+    def save_page(self, row: SavePageRow) -> bool:
+        saved = self.store.save_page(row)
+        if saved and row[1] in self.namespace_ids:
+            self.add_row(
+                (row[0], row[1], row[3], int(row[4]), row[2], row[5], row[8])
+            )
+        return saved
+
+    def save_bulk_load_pages(self, rows: list[SavePageRow]) -> None:
+        self.store.save_bulk_load_pages(rows)
+
+    @contextmanager
+    def bulk_load(self, resumable: bool = False) -> Iterator[None]:
+        try:
+            with self.store.bulk_load(resumable):
+                yield
+        finally:
+            self.load_pages()
+
+    def delete_page(self, title: str, namespace_id: int) -> None:
+        self.store.delete_page(title, namespace_id)
+        self.remove_row(title, namespace_id)
+
+    def iter_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        include_body: bool = True,
+        shard: int = 0,
+        num_shards: int = 1,
+    ) -> Iterator[PageRow]:
+        return self.store.iter_pages(
+            namespace_ids,
+            include_redirects,
+            model,
+            search_pattern,
+            include_body,
+            shard,
+            num_shards,
+        )
+
+    def count_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+    ) -> int:
+        return self.store.count_pages(
+            namespace_ids, include_redirects, model, search_pattern
+        )
+
+    def has_pages(self) -> bool:
+        return self.store.has_pages()
+
+    def iter_title_keys(self) -> Iterator[tuple[str, int]]:
+        return self.store.iter_title_keys()
+
+    def has_need_pre_expand_pages(self) -> bool:
+        return self.store.has_need_pre_expand_pages()
+
+    def need_pre_expand_titles(self, namespace_id: int) -> list[str]:
+        return self.store.need_pre_expand_titles(namespace_id)
+
+    def update_need_pre_expand(
+        self, title: str, namespace_id: int, need_pre_expand: bool
+    ) -> None:
+        rows = self.pages.get(
+            (self.title_key(title, namespace_id), namespace_id), []
+        )
+        for index, row in enumerate(rows):
+            if row[0] == title:
+                rows[index] = row[:3] + (int(need_pre_expand),) + row[4:]
+
+    def set_need_pre_expand(self, title: str) -> None:
+        self.store.set_need_pre_expand(title)
+        for namespace_id in self.namespace_ids:
+            self.update_need_pre_expand(title, namespace_id, True)
+
+    def clear_need_pre_expand(
+        self, titles: Iterable[str], namespace_id: int
+    ) -> None:
+        titles = set(titles)
+        self.store.clear_need_pre_expand(titles, namespace_id)
+        if namespace_id in self.namespace_ids:
+            for title in titles:
+                self.update_need_pre_expand(title, namespace_id, False)
+
+    def clear_redirect_need_pre_expand(self, namespace_id: int) -> None:
+        self.store.clear_redirect_need_pre_expand(namespace_id)
+        if namespace_id in self.namespace_ids:
+            for (_, row_namespace_id), rows in self.pages.items():
+                if row_namespace_id == namespace_id:
+                    rows[:] = [
+                        row[:3] + (0,) + row[4:] if row[2] is not None else row
+                        for row in rows
+                    ]
+
+    def propagate_redirect_need_pre_expand(self) -> None:
+        self.store.propagate_redirect_need_pre_expand()
+        # same as the database update, redirects are in the same namespace
+        rows = {
+            (row[0], row[1]): row
+            for title_rows in self.pages.values()
+            for row in title_rows
+        }
+        # redirected source templates
+        changed = [
+            row
+            for row in rows.values()
+            if row[2] is not None
+            and not row[3]
+            and (dest := rows.get((row[2], row[1]))) is not None
+            and dest[3]
+        ]
+        for row in changed:
+            self.update_need_pre_expand(row[0], row[1], True)
+            rows[(row[0], row[1])] = row[:3] + (1,) + row[4:]
+        # redirected destination pages
+        for row in [
+            dest
+            for row in rows.values()
+            if row[2] is not None
+            and row[3]
+            and (dest := rows.get((row[2], row[1]))) is not None
+            and not dest[3]
+        ]:
+            self.update_need_pre_expand(row[0], row[1], True)
+
+
+PACK_MAGIC = b"WTPPACK1"
+# magic, page count, need pre-expand page count, records offset, key slots
+# offset, key slot count, title slots offset, title slot count, page ids
+# offset, page id count
+PACK_HEADER = struct.Struct("<8sQQQQQQQQQ")
+# data offset, title key length, title length, redirect length, body
+# length, model length, namespace id, need_pre_expand, page id
+# lengths of `None` are -1
+PACK_RECORD = struct.Struct("<QIIiiIiB3xq")
+NO_NAMESPACE_ID = -(1 << 31)
+NO_PAGE_ID = -1
+
+
+def page_pack_path(db_path: Path) -> Path:
+    return db_path.with_suffix(".pack")
+
+
+def pack_key_hash(title_key: bytes, namespace_id: int) -> int:
+    return zlib.crc32(title_key, namespace_id & 0xFFFFFFFF)
+
+
+def pack_slot_count(page_count: int) -> int:
+    # power of two, at most 75% used
+    slot_count = 8
+    while slot_count * 3 < page_count * 4:
+        slot_count *= 2
+    return slot_count
+
+
+def insert_pack_slot(slots: array, slot_hash: int, record_index: int) -> None:
+    mask = len(slots) - 1
+    slot = slot_hash & mask
+    while slots[slot] != 0:
+        slot = (slot + 1) & mask
+    # 0 is empty slot
+    slots[slot] = record_index + 1
+
+
+def write_page_pack(
+    path: Path, rows: Iterable[tuple[str, PageRow]]
+) -> tuple[int, int]:
+    """Save pages to a single read-only file used by `PagePackStore`.
+    `rows` are title keys and page rows with decompressed body. Returns the
+    numbers of saved pages and bytes.
+
+    The file has a header, page data (title key, title, redirect target,
+    body and model UTF-8 text of each page), fixed size page records
+    sorted by title key, namespace id and title, hash tables of title key
+    and title for finding records, and sorted page ids."""
+    temp_path = path.with_name(path.name + ".tmp")
+    records: list[tuple[bytes, int, str, bytes]] = []
+    with temp_path.open("wb") as f:
+        f.write(bytes(PACK_HEADER.size))
+        data_offset = PACK_HEADER.size
+        for title_key, row in rows:
+            title, namespace_id, redirect_to, need_pre_expand, body = row[:5]
+            model, page_id = row[5:7]
+            if namespace_id is None:
+                namespace_id = NO_NAMESPACE_ID
+            key_bytes = title_key.encode()
+            title_bytes = title.encode()
+            redirect_bytes = (
+                b"" if redirect_to is None else redirect_to.encode()
+            )
+            body_bytes = b"" if body is None else body.encode()
+            model_bytes = b"" if model is None else model.encode()
+            records.append(
+                (
+                    key_bytes,
+                    namespace_id,
+                    title,
+                    PACK_RECORD.pack(
+                        data_offset,
+                        len(key_bytes),
+                        len(title_bytes),
+                        -1 if redirect_to is None else len(redirect_bytes),
+                        -1 if body is None else len(body_bytes),
+                        len(model_bytes),
+                        namespace_id,
+                        need_pre_expand == 1,
+                        NO_PAGE_ID if page_id is None else page_id,
+                    ),
+                )
+            )
+            for data in (
+                key_bytes,
+                title_bytes,
+                redirect_bytes,
+                body_bytes,
+                model_bytes,
+            ):
+                f.write(data)
+                data_offset += len(data)
+
+        records.sort(key=lambda record: record[:3])
+        f.write(bytes(-data_offset % 8))
+        records_offset = data_offset + (-data_offset % 8)
+        key_slots = array("I", bytes(4 * pack_slot_count(len(records))))
+        title_slots = array("I", bytes(4 * pack_slot_count(len(records))))
+        page_ids: list[tuple[int, int]] = []
+        pre_expand_count = 0
+        for index, (key_bytes, namespace_id, title, record) in enumerate(
+            records
+        ):
+            f.write(record)
+            insert_pack_slot(
+                key_slots, pack_key_hash(key_bytes, namespace_id), index
+            )
+            insert_pack_slot(title_slots, zlib.crc32(title.encode()), index)
+            _, _, _, _, _, _, _, need_pre_expand, page_id = PACK_RECORD.unpack(
+                record
+            )
+            pre_expand_count += need_pre_expand
+            if page_id != NO_PAGE_ID:
+                page_ids.append((page_id, index))
+        key_slots_offset = records_offset + PACK_RECORD.size * len(records)
+        f.write(key_slots.tobytes())
+        title_slots_offset = key_slots_offset + 4 * len(key_slots)
+        f.write(title_slots.tobytes())
+        page_ids.sort()
+        page_ids_offset = title_slots_offset + 4 * len(title_slots)
+        f.write(bytes(-page_ids_offset % 8))
+        page_ids_offset += -page_ids_offset % 8
+        f.write(array("q", (page_id for page_id, _ in page_ids)).tobytes())
+        f.write(array("I", (index for _, index in page_ids)).tobytes())
+        file_size = f.tell()
+        f.seek(0)
+        f.write(
+            PACK_HEADER.pack(
+                PACK_MAGIC,
+                len(records),
+                pre_expand_count,
+                records_offset,
+                key_slots_offset,
+                len(key_slots),
+                title_slots_offset,
+                len(title_slots),
+                page_ids_offset,
+                len(page_ids),
+            )
+        )
+    temp_path.replace(path)
+    return len(records), file_size
+
+
+class PagePackStore(PageStore):
+    """Read-only store of the pages file created by `Wtp.export_page_pack()`.
+    The file is memory-mapped, so forked processes share one copy of page
+    text in memory. Pages are found with hash tables in the file, no
+    SQL query is used."""
+
+    def __init__(
+        self,
+        db_conn: sqlite3.Connection,
+        decompress_body: Optional[DecompressBody] = None,
+        db_path: Optional[Path] = None,
+    ):
+        super().__init__(db_conn, decompress_body, db_path)
+        assert db_path is not None
+        path = page_pack_path(db_path)
+        if not path.exists():
+            raise ValueError(f"Page pack file {path} doesn't exist")
+        with path.open("rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            self.page_count,
+            self.pre_expand_count,
+            self.records_offset,
+            key_slots_offset,
+            key_slot_count,
+            title_slots_offset,
+            title_slot_count,
+            page_ids_offset,
+            page_id_count,
+        ) = PACK_HEADER.unpack_from(self.mm)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{path} is not a page pack file")
+        view = memoryview(self.mm)
+        self.key_slots = view[
+            key_slots_offset : key_slots_offset + 4 * key_slot_count
+        ].cast("I")
+        self.title_slots = view[
+            title_slots_offset : title_slots_offset + 4 * title_slot_count
+        ].cast("I")
+        self.page_ids = view[
+            page_ids_offset : page_ids_offset + 8 * page_id_count
+        ].cast("q")
+        page_id_indexes_offset = page_ids_offset + 8 * page_id_count
+        self.page_id_indexes = view[
+            page_id_indexes_offset : page_id_indexes_offset + 4 * page_id_count
+        ].cast("I")
+
+    def close(self) -> None:
+        for view in (
+            self.key_slots,
+            self.title_slots,
+            self.page_ids,
+            self.page_id_indexes,
+        ):
+            view.release()
+        self.mm.close()
+
+    def record(self, index: int) -> tuple:
+        return PACK_RECORD.unpack_from(
+            self.mm, self.records_offset + index * PACK_RECORD.size
+        )
+
+    def record_key(self, record: tuple) -> bytes:
+        return self.mm[record[0] : record[0] + record[1]]
+
+    def record_title(self, record: tuple) -> bytes:
+        offset = record[0] + record[1]
+        return self.mm[offset : offset + record[2]]
+
+    def page_row(self, record: tuple, include_body: bool = True) -> PageRow:
+        mm = self.mm
+        (
+            offset,
+            key_length,
+            title_length,
+            redirect_length,
+            body_length,
+            model_length,
+            namespace_id,
+            need_pre_expand,
+            page_id,
+        ) = record
+        offset += key_length
+        title = mm[offset : offset + title_length].decode()
+        offset += title_length
+        redirect_to = None
+        if redirect_length >= 0:
+            redirect_to = mm[offset : offset + redirect_length].decode()
+            offset += redirect_length
+        body = None
+        if body_length >= 0:
+            if include_body:
+                body = mm[offset : offset + body_length].decode()
+            offset += body_length
+        model = mm[offset : offset + model_length].decode()
+        return (
+            title,
+            None if namespace_id == NO_NAMESPACE_ID else namespace_id,
+            redirect_to,
+            need_pre_expand,
+            body,
+            model,
+            None if page_id == NO_PAGE_ID else page_id,
+        )
+
+    def find_records(
+        self, slots: memoryview, slot_hash: int, match: Callable[[tuple], bool]
+    ) -> list[tuple]:
+        records = []
+        mask = len(slots) - 1
+        slot = slot_hash & mask
+        while (index := slots[slot]) != 0:
+            record = self.record(index - 1)
+            if match(record):
+                records.append(record)
+            slot = (slot + 1) & mask
+        return records
+
+    def get_pages(self, title_key: str, namespace_id: int) -> list[PageRow]:
+        key_bytes = title_key.encode()
+        records = self.find_records(
+            self.key_slots,
+            pack_key_hash(key_bytes, namespace_id),
+            lambda record: (
+                record[6] == namespace_id
+                and self.record_key(record) == key_bytes
+            ),
+        )
+        return [self.page_row(record) for record in records]
+
+    def get_pages_by_title(self, title: str) -> list[PageRow]:
+        title_bytes = title.encode()
+        records = self.find_records(
+            self.title_slots,
+            zlib.crc32(title_bytes),
+            lambda record: self.record_title(record) == title_bytes,
+        )
+        return sorted(
+            (self.page_row(record) for record in records),
+            key=lambda row: row[1],
+        )
+
+    def get_page_by_id(self, page_id: int) -> Optional[PageRow]:
+        index = bisect_left(self.page_ids, page_id)  # type: ignore[arg-type]
+        if index < len(self.page_ids) and self.page_ids[index] == page_id:
+            return self.page_row(self.record(self.page_id_indexes[index]))
+        return None
+
+    def get_sha1(
+        self, title: str, namespace_id: Optional[int]
+    ) -> Optional[str]:
+        return None
+
+    def get_redirect_to(
+        self, title: str, namespace_id: int
+    ) -> list[Optional[str]]:
+        return []
+
+    def read_only_error(self) -> ValueError:
+        return ValueError(f"Page pack file of {self.db_path} is read-only")
+
+    def save_page(self, row: SavePageRow) -> bool:
+        raise self.read_only_error()
+
+    def save_bulk_load_pages(self, rows: list[SavePageRow]) -> None:
+        raise self.read_only_error()
+
+    def delete_page(self, title: str, namespace_id: int) -> None:
+        raise self.read_only_error()
+
+    def iter_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+        include_body: bool = True,
+        shard: int = 0,
+        num_shards: int = 1,
+    ) -> Iterator[PageRow]:
+        search_re = (
+            like_pattern_to_re(search_pattern) if search_pattern else None
+        )
+        for index in range(*shard_range(0, self.page_count, shard, num_shards)):
+            record = self.record(index)
+            if (namespace_ids is None or record[6] in namespace_ids) and (
+                include_redirects or record[3] < 0
+            ):
+                row = self.page_row(
+                    record, include_body or search_re is not None
+                )
+                if (model is None or row[5] == model) and (
+                    search_re is None or search_re.fullmatch(row[4] or "")
+                ):
+                    yield row if include_body else without_body(row)
+
+    def count_pages(
+        self,
+        namespace_ids: Optional[list[int]] = None,
+        include_redirects: bool = True,
+        model: Optional[str] = None,
+        search_pattern: Optional[str] = None,
+    ) -> int:
+        if (
+            namespace_ids is None
+            and include_redirects
+            and model is None
+            and not search_pattern
+        ):
+            return self.page_count
+        return sum(
+            1
+            for _ in self.iter_pages(
+                namespace_ids, include_redirects, model, search_pattern
+            )
+        )
+
+    def has_pages(self) -> bool:
+        return self.page_count > 0
+
+    def iter_title_keys(self) -> Iterator[tuple[str, int]]:
+        for index in range(self.page_count):
+            record = self.record(index)
+            yield self.record_key(record).decode(), record[6]
+
+    def has_need_pre_expand_pages(self) -> bool:
+        return self.pre_expand_count > 0
+
+    def need_pre_expand_titles(self, namespace_id: int) -> list[str]:
+        return [
+            self.record_title(record).decode()
+            for index in range(self.page_count)
+            if (record := self.record(index))[6] == namespace_id and record[7]
+        ]
+
+    def set_need_pre_expand(self, title: str) -> None:
+        raise self.read_only_error()
+
+    def clear_need_pre_expand(
+        self, titles: Iterable[str], namespace_id: int
+    ) -> None:
+        raise self.read_only_error()
+
+    def clear_redirect_need_pre_expand(self, namespace_id: int) -> None:
+        raise self.read_only_error()
+
+    def propagate_redirect_need_pre_expand(self) -> None:
+        raise self.read_only_error()
+
+
+PAGE_STORES: dict[str, type[PageStore]] = {
+    "sqlite": SQLitePageStore,
+    "memory": MemoryPageStore,
+    "mmap": MmapPageStore,
+    "pack": PagePackStore,
+}
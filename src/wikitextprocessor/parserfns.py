@@ -1512,10 +1512,9 @@ def pagesize_fn(
     page_name = args[0]
     comma_formatting = args[1].strip() == "R" if len(args) >= 2 else False
 
-    body = wtp.get_page_body(page_name, None)
-    if body is None:
+    body_length = wtp.get_page_size(page_name)
+    if body_length is None:
         return '<strong class="error">Page not found for PAGESIZE</strong>'
-    body_length = len(body.encode("utf-8"))
     if comma_formatting:
         return f"{body_length:,}"
     else:
@@ -1622,13 +1621,13 @@ def localhour_fn(
 def number_of_pages_fn(
     wtp: "Wtp", fn_name: str, args: list[str], expander: Callable[[str], str]
 ) -> str:
-    return str(wtp.saved_page_nums())
+    return str(wtp.get_site_stats().pages)
 
 
 def number_of_articles_fn(
     wtp: "Wtp", fn_name: str, args: list[str], expander: Callable[[str], str]
 ) -> str:
-    return str(wtp.saved_page_nums([0], False))
+    return str(wtp.get_site_stats().articles)
 
 
 def rel2abs_fn(
@@ -0,0 +1,107 @@
+import hashlib
+import json
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+
+class CatalogEntry(NamedTuple):
+    need_pre_expand: bool
+    redirect_to: Optional[str]
+    # Length of the UTF-8 encoded page body
+    body_length: int
+    # 64-bit BLAKE2b hash of the body, changes when the page is changed
+    body_hash: int
+
+
+def body_length_and_hash(body: Optional[str]) -> tuple[int, int]:
+    data = (body or "").encode()
+    return len(data), int.from_bytes(
+        hashlib.blake2b(data, digest_size=8).digest(), "little"
+    )
+
+
+class TemplateCatalog:
+    """Data of template and module pages used without reading page bodies,
+    keys are saved page titles and namespace ids. The catalog is created
+    once and saved in the database `metadata` table, pages changed later
+    are updated in memory."""
+
+    __slots__ = ("namespace_ids", "entries")
+
+    def __init__(
+        self,
+        namespace_ids: Iterable[int],
+        entries: Optional[dict[tuple[str, int], CatalogEntry]] = None,
+    ):
+        self.namespace_ids = frozenset(namespace_ids)
+        self.entries = {} if entries is None else entries
+
+    def add_page(
+        self,
+        title: str,
+        namespace_id: int,
+        redirect_to: Optional[str],
+        need_pre_expand: bool,
+        body: Optional[str],
+    ) -> None:
+        self.entries[(title, namespace_id)] = CatalogEntry(
+            need_pre_expand, redirect_to, *body_length_and_hash(body)
+        )
+
+    def remove_page(self, title: str, namespace_id: int) -> None:
+        self.entries.pop((title, namespace_id), None)
+
+    def get(
+        self, titles: Iterable[str], namespace_id: int
+    ) -> Optional[CatalogEntry]:
+        """Return the entry of the first saved title."""
+        for title in titles:
+            entry = self.entries.get((title, namespace_id))
+            if entry is not None:
+                return entry
+        return None
+
+    def set_need_pre_expand(
+        self, title: str, namespace_id: int, need_pre_expand: bool
+    ) -> None:
+        entry = self.entries.get((title, namespace_id))
+        if entry is not None:
+            self.entries[(title, namespace_id)] = entry._replace(
+                need_pre_expand=need_pre_expand
+            )
+
+    def update_need_pre_expand(
+        self, namespace_id: int, titles: Iterable[str]
+    ) -> None:
+        """Only pages of `titles` in the namespace need pre-expand."""
+        titles = set(titles)
+        for (title, entry_namespace_id), entry in self.entries.items():
+            if entry_namespace_id == namespace_id and entry.need_pre_expand != (
+                title in titles
+            ):
+                self.entries[(title, namespace_id)] = entry._replace(
+                    need_pre_expand=title in titles
+                )
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(
+            {
+                "namespace_ids": sorted(self.namespace_ids),
+                "entries": [
+                    [title, namespace_id, *entry]
+                    for (title, namespace_id), entry in self.entries.items()
+                ],
+            },
+            ensure_ascii=False,
+        ).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TemplateCatalog":
+        catalog_data = json.loads(data)
+        return cls(
+            catalog_data["namespace_ids"],
+            {
+                (entry[0], entry[1]): CatalogEntry(*entry[2:])
+                for entry in catalog_data["entries"]
+            },
+        )
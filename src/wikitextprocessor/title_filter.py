@@ -0,0 +1,86 @@
+import hashlib
+import struct
+from array import array
+from collections.abc import Iterable
+from typing import Optional
+
+# About 1% false positive rate
+BITS_PER_TITLE = 12
+HASH_COUNT = 6
+# magic, hash count
+HEADER_FORMAT = "<4sB"
+HEADER_MAGIC = b"TFB1"
+
+
+class TitleFilter:
+    """Bloom filter of saved page title keys. `get_page()` doesn't query
+    the database if the title is not in the filter, the filter could
+    return `True` for titles not saved but never returns `False` for saved
+    titles.
+
+    The bits of a title are in one 64-bit word (blocked Bloom filter), so
+    a lookup only checks one word."""
+
+    __slots__ = ("hash_count", "words")
+
+    def __init__(
+        self,
+        title_count: int,
+        hash_count: int = HASH_COUNT,
+        words: Optional[array] = None,
+    ):
+        self.hash_count = hash_count
+        if words is None:
+            words = array(
+                "Q",
+                bytes(8 * max((title_count * BITS_PER_TITLE + 63) // 64, 1)),
+            )
+        self.words = words
+
+    @classmethod
+    def build(
+        cls, title_count: int, keys: Iterable[tuple[str, Optional[int]]]
+    ) -> "TitleFilter":
+        title_filter = cls(title_count)
+        for title_key, namespace_id in keys:
+            title_filter.add(title_key, namespace_id)
+        return title_filter
+
+    def word_mask(
+        self, title_key: str, namespace_id: Optional[int]
+    ) -> tuple[int, int]:
+        h1, h2 = struct.unpack(
+            "<QQ",
+            hashlib.blake2b(
+                f"{namespace_id}:{title_key}".encode(), digest_size=16
+            ).digest(),
+        )
+        mask = 0
+        for i in range(self.hash_count):
+            mask |= 1 << (h2 >> (6 * i) & 63)
+        return h1 % len(self.words), mask
+
+    def add(self, title_key: str, namespace_id: Optional[int]) -> None:
+        index, mask = self.word_mask(title_key, namespace_id)
+        self.words[index] |= mask
+
+    def may_contain(self, title_key: str, namespace_id: Optional[int]) -> bool:
+        index, mask = self.word_mask(title_key, namespace_id)
+        return self.words[index] & mask == mask
+
+    def to_bytes(self) -> bytes:
+        return (
+            struct.pack(HEADER_FORMAT, HEADER_MAGIC, self.hash_count)
+            + self.words.tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Optional["TitleFilter"]:
+        """Return `None` if the data is saved in an unknown format."""
+        header_size = struct.calcsize(HEADER_FORMAT)
+        magic, hash_count = struct.unpack(HEADER_FORMAT, data[:header_size])
+        if magic != HEADER_MAGIC:
+            return None
+        words = array("Q")
+        words.frombytes(data[header_size:])
+        return cls(0, hash_count, words)
@@ -119,6 +119,8 @@ def save_statement_cache(
     prop_value: str,
     prop_type: Optional[str],
 ) -> None:
+    if wtp.read_only:
+        return
     with wtp.db_conn:
         insert_item(
             wtp,
@@ -231,6 +233,8 @@ def get_item_cache(wtp: "Wtp", item_id: str) -> Optional[WikiDataItem]:
 
 
 def insert_item(wtp: "Wtp", item: WikiDataItem) -> None:
+    if wtp.read_only:
+        return
     if len(item.entity_data) > 0:
         wtp.db_conn.execute(
             """
@@ -300,6 +304,8 @@ def save_entity_id_cache(
     item_label: str,
     item_desc: str,
 ) -> None:
+    if wtp.read_only:
+        return
     with wtp.db_conn:
         if item_id is not None:
             insert_item(
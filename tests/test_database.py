@@ -0,0 +1,679 @@
+import pickle
+import re
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from wikitextprocessor import Page, Wtp
+from wikitextprocessor.core import HOT_NAMESPACES, SiteStats
+from wikitextprocessor.luaexec import add_empty_sandbox_lua_module
+from wikitextprocessor.pagestore import PreloadPageStore
+
+
+class DatabaseTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.wtp = Wtp()
+
+    def tearDown(self) -> None:
+        self.wtp.close_db_conn()
+
+    def test_bulk_load(self) -> None:
+        self.wtp.add_page("old page", 0, "old text")
+        self.wtp.add_page("Template:foo", 10, "old template")
+        self.wtp.db_conn.commit()
+        with self.wtp.bulk_load(batch_size=2):
+            self.wtp.add_page("Template:foo", 10, "foo<noinclude>doc")
+            self.wtp.add_page("page", 0, "first text")
+            self.wtp.add_page("page", 0, "second text")
+            self.wtp.add_page("Module:bar", 828, "bar", model="Scribunto")
+        self.assertEqual(self.wtp.saved_page_nums(), 4)
+        self.assertEqual(self.wtp.get_page_body("page", 0), "second text")
+        self.assertEqual(self.wtp.get_page_body("old page", 0), "old text")
+        self.assertEqual(
+            self.wtp.get_page("Template:foo", 10),
+            Page("Template:foo", 10, body="foo", model="wikitext"),
+        )
+        self.assertEqual(
+            self.wtp.get_page("Module:bar", 828),
+            Page("Module:bar", 828, body="bar", model="Scribunto"),
+        )
+        # settings are restored and the temporary table is removed
+        self.assertEqual(
+            self.wtp.db_conn.execute("PRAGMA journal_mode").fetchone(),
+            ("wal",),
+        )
+        self.assertEqual(
+            self.wtp.db_conn.execute("PRAGMA synchronous").fetchone(), (2,)
+        )
+        self.assertEqual(
+            self.wtp.db_conn.execute(
+                "SELECT count(*) FROM sqlite_schema "
+                "WHERE name = 'bulk_load_pages'"
+            ).fetchone(),
+            (0,),
+        )
+
+    def test_title_key(self) -> None:
+        self.wtp.add_page("Template:Foo bar", 10, "upper")
+        self.wtp.add_page("Template:baz", 10, "lower")
+        self.wtp.add_page("Template:Baz", 10, "upper")
+        self.wtp.db_conn.commit()
+        for title in (
+            "Template:Foo bar",
+            "Template:foo_bar",
+            "template:foo bar",
+            "foo bar",
+        ):
+            with self.subTest(title=title):
+                self.assertEqual(self.wtp.get_page_body(title, 10), "upper")
+        # the exact title is preferred
+        self.assertEqual(self.wtp.get_page_body("baz", 10), "lower")
+        self.assertEqual(self.wtp.get_page_body("Baz", 10), "upper")
+        self.assertIsNone(self.wtp.get_page("Foo Bar", 10))
+        self.assertIn(
+            "USING INDEX pages_title_key",
+            self.wtp.db_conn.execute(
+                "EXPLAIN QUERY PLAN SELECT title FROM pages "
+                "WHERE title_key = ? AND namespace_id = ?",
+                ("Template:Baz", 10),
+            ).fetchone()[-1],
+        )
+
+    def test_add_title_key_column(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            wtp.add_page("Template:foo", 10, "foo")
+            wtp.db_conn.executescript(
+                """DROP INDEX pages_title_key;
+                ALTER TABLE pages DROP COLUMN title_key;"""
+            )
+            wtp.close_db_conn()
+            wtp = Wtp(db_path=db_path)
+            self.assertEqual(
+                wtp.db_conn.execute("SELECT title_key FROM pages").fetchall(),
+                [("Template:Foo",)],
+            )
+            self.assertEqual(wtp.get_page_body("foo", 10), "foo")
+            wtp.close_db_conn()
+
+    def test_page_cache(self) -> None:
+        self.wtp.add_page("Template:foo", 10, "old")
+        self.wtp.add_page("page", 0, "text")
+        self.assertEqual(self.wtp.get_page_body("foo", 10), "old")
+        self.assertEqual(self.wtp.get_page_body("Template:foo", 10), "old")
+        self.assertEqual(self.wtp.get_page_body("page", 0), "text")
+        stats = self.wtp.page_cache.stats()
+        self.assertEqual(stats["template"]["hits"], 1)
+        self.assertEqual(stats["template"]["misses"], 1)
+        self.assertEqual(stats["page"]["misses"], 1)
+        # changed page is not read from cache
+        self.wtp.add_page("Template:foo", 10, "new")
+        self.assertEqual(self.wtp.get_page_body("foo", 10), "new")
+        self.wtp.set_template_pre_expand("Template:foo")
+        self.assertTrue(self.wtp.get_page("foo", 10).need_pre_expand)
+        self.wtp.delete_page("page", 0)
+        self.assertIsNone(self.wtp.get_page("page", 0))
+        # other Wtp objects use their own cache
+        other_wtp = Wtp(db_path=self.wtp.db_path)
+        self.assertEqual(other_wtp.page_cache.stats()["template"]["hits"], 0)
+        other_wtp.close_db_conn()
+
+    def test_page_cache_size(self) -> None:
+        wtp = Wtp(template_cache_bytes=5000, page_cache_bytes=0)
+        for index in range(10):
+            wtp.add_page(f"Template:{index}", 10, "a" * 1000)
+            wtp.get_page(str(index), 10)
+        wtp.add_page("page", 0, "text")
+        wtp.get_page("page", 0)
+        pool = wtp.page_cache.template_pool
+        self.assertLessEqual(pool.size, 5000)
+        # least recently used pages are removed
+        self.assertNotIn(("Template:0", 10), pool.entries)
+        self.assertIn(("Template:9", 10), pool.entries)
+        self.assertEqual(len(wtp.page_cache.page_pool.entries), 0)
+        wtp.close_db_conn()
+
+    def test_title_filter(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            with wtp.bulk_load():
+                wtp.add_page("Template:foo", 10, "foo")
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            self.assertIsNotNone(wtp.title_filter)
+            queries = []
+            wtp.db_conn.set_trace_callback(queries.append)
+            self.assertIsNone(wtp.get_page("not exist", 10))
+            self.assertEqual(queries, [])
+            self.assertEqual(wtp.get_page_body("foo", 10), "foo")
+            self.assertEqual(len(queries), 1)
+            wtp.db_conn.set_trace_callback(None)
+            # new page is added to the filter, the saved filter is removed
+            # until the filter is saved again
+            wtp.add_page("Template:bar", 10, "bar")
+            self.assertEqual(wtp.get_page_body("bar", 10), "bar")
+            self.assertFalse(wtp.title_filter_saved)
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            self.assertTrue(wtp.title_filter_saved)
+            self.assertTrue(wtp.title_filter.may_contain("Template:Bar", 10))
+            self.assertEqual(wtp.get_page_body("bar", 10), "bar")
+            wtp.close_db_conn()
+
+    def test_site_stats(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            with wtp.bulk_load():
+                wtp.add_page("foo", 0, "foo")
+                wtp.add_page("bar", 0, redirect_to="foo")
+                wtp.add_page("Template:foo", 10, "foo")
+            self.assertEqual(wtp.site_stats, SiteStats(3, 1))
+            queries = []
+            wtp.db_conn.set_trace_callback(queries.append)
+            wtp.add_page("bar", 0, "bar")
+            wtp.add_page("baz", 0, redirect_to="foo")
+            wtp.delete_page("Template:foo", 10)
+            wtp.db_conn.set_trace_callback(None)
+            self.assertEqual(wtp.site_stats, SiteStats(3, 2))
+            # page bodies are not read, the statistics are saved once
+            self.assertFalse(
+                any(
+                    query.startswith("SELECT") and "body" in query
+                    for query in queries
+                )
+            )
+            self.assertEqual(
+                sum("'site_stats'" in query for query in queries), 1
+            )
+            self.assertFalse(wtp.site_stats_saved)
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            queries = []
+            wtp.db_conn.set_trace_callback(queries.append)
+            wtp.start_page("test")
+            self.assertEqual(
+                wtp.expand("{{NUMBEROFPAGES}} {{NUMBEROFARTICLES}}"), "3 2"
+            )
+            self.assertEqual(queries, [])
+            wtp.db_conn.set_trace_callback(None)
+            wtp.close_db_conn()
+
+    def test_backup_overwritten_pages(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            with wtp.bulk_load():
+                wtp.add_page("Template:foo", 10, "foo", sha1="a")
+                wtp.add_page("Template:bar", 10, "bar", need_pre_expand=True)
+                wtp.add_page("page", 0, "text")
+            wtp.db_conn.execute(
+                "INSERT INTO template_includes VALUES('Template:bar', 'Foo')"
+            )
+            wtp.backup_overwritten_pages()
+            wtp.add_page("Template:foo", 10, "new foo")
+            wtp.add_page("Template:foo", 10, "newer foo")
+            wtp.add_page("Template:baz", 10, "baz", need_pre_expand=True)
+            wtp.delete_page("page", 0)
+            wtp.page_store.clear_need_pre_expand(["Template:bar"], 10)
+            wtp.db_conn.execute("DELETE FROM template_includes")
+            self.assertEqual(wtp.get_page_body("foo", 10), "newer foo")
+            self.assertEqual(wtp.site_stats, SiteStats(3, 0))
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            self.assertEqual(wtp.get_page_body("foo", 10), "foo")
+            self.assertIsNone(wtp.get_page("baz", 10))
+            self.assertEqual(wtp.get_page_body("page", 0), "text")
+            self.assertEqual(
+                wtp.page_store.need_pre_expand_titles(10), ["Template:bar"]
+            )
+            self.assertEqual(
+                wtp.db_conn.execute(
+                    "SELECT * FROM template_includes"
+                ).fetchall(),
+                [("Template:bar", "Foo")],
+            )
+            self.assertEqual(wtp.site_stats, SiteStats(3, 1))
+            self.assertFalse(wtp.has_table("overwritten_pages"))
+            # restored pages are not changed if SHA-1 is not changed
+            self.assertFalse(
+                wtp.add_page("Template:foo", 10, "new foo", sha1="a")
+            )
+            wtp.close_db_conn()
+
+    def test_resolve_redirects(self) -> None:
+        for backend in ("sqlite", "memory"):
+            with self.subTest(backend=backend):
+                wtp = Wtp(page_store_backend=backend)
+                with wtp.bulk_load():
+                    wtp.add_page("Template:a", 10, redirect_to="Template:b")
+                    wtp.add_page("Template:b", 10, redirect_to="template:c")
+                    wtp.add_page("Template:c", 10, "c")
+                    wtp.add_page("Template:d", 10, "d")
+                    wtp.add_page("Template:e", 10, redirect_to="Template:f")
+                    wtp.add_page("Template:f", 10, redirect_to="Template:e")
+                    wtp.add_page("Template:g", 10, redirect_to="Template:h")
+                    wtp.add_page("Template:m", 10, redirect_to="Module:m")
+                    wtp.add_page("Module:m", 828, "return {}")
+                self.assertTrue(wtp.redirects_resolved)
+                queries = []
+                wtp.db_conn.set_trace_callback(queries.append)
+                self.assertEqual(wtp.get_page_body("a", 10), "c")
+                if backend == "sqlite":
+                    self.assertEqual(len(queries), 1)
+                wtp.db_conn.set_trace_callback(None)
+                self.assertIsNone(wtp.get_page_body("e", 10))
+                self.assertIsNone(wtp.get_page_body("g", 10))
+                self.assertEqual(wtp.get_page_body("m", 10), "return {}")
+                # saved targets are not used after a redirect page changed
+                wtp.add_page("Template:b", 10, redirect_to="Template:d")
+                self.assertFalse(wtp.redirects_resolved)
+                self.assertEqual(wtp.get_page_body("a", 10), "d")
+                wtp.add_page("Template:h", 10, "h")
+                self.assertEqual(wtp.get_page_body("g", 10), "h")
+                wtp.resolve_redirects()
+                self.assertEqual(wtp.get_page_body("a", 10), "d")
+                # a page in the chain is changed to redirect
+                wtp.add_page("Template:d", 10, redirect_to="Template:c")
+                self.assertFalse(wtp.redirects_resolved)
+                self.assertEqual(wtp.get_page_body("a", 10), "c")
+                wtp.close_db_conn()
+
+    def test_template_catalog(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            with wtp.bulk_load():
+                wtp.add_page("Template:foo", 10, "föö", need_pre_expand=True)
+                wtp.add_page("Template:bar", 10, redirect_to="Template:foo")
+                wtp.add_page("Module:baz", 828, "return {}")
+            self.assertTrue(wtp.template_catalog_saved)
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            queries = []
+            wtp.db_conn.set_trace_callback(queries.append)
+            self.assertTrue(wtp.check_template_need_expand("foo"))
+            self.assertFalse(wtp.check_template_need_expand("bar"))
+            self.assertTrue(wtp.page_exists("baz", 828))
+            self.assertFalse(wtp.page_exists("not exist", 10))
+            self.assertEqual(wtp.get_page_size("Template:foo"), 5)
+            self.assertEqual(queries, [])
+            wtp.db_conn.set_trace_callback(None)
+            wtp.start_page("test")
+            self.assertEqual(wtp.expand("{{PAGESIZE:Template:bar}}"), "5")
+            wtp.add_page("Template:foo", 10, "foo")
+            wtp.set_template_pre_expand("Template:bar")
+            self.assertFalse(wtp.check_template_need_expand("foo"))
+            self.assertTrue(wtp.check_template_need_expand("bar"))
+            wtp.delete_page("baz", 828)
+            self.assertFalse(wtp.page_exists("baz", 828))
+            self.assertFalse(wtp.template_catalog_saved)
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            self.assertTrue(wtp.template_catalog_saved)
+            self.assertEqual(wtp.get_page_size("Template:foo"), 3)
+            self.assertTrue(wtp.check_template_need_expand("bar"))
+            self.assertFalse(wtp.page_exists("baz", 828))
+            wtp.close_db_conn()
+
+    def test_optimize_db(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path, search_index=True)
+            wtp.add_page("Template:foo", 10, "{{bar}}")
+            wtp.add_page("b", 0, "{{foo}}")
+            wtp.add_page("a", 0, redirect_to="b")
+            wtp.add_page("Module:baz", 828, "return {}")
+            wtp.optimize_db()
+            self.assertEqual(
+                [
+                    (title, namespace_id)
+                    for title, namespace_id in wtp.db_conn.execute(
+                        "SELECT title, namespace_id FROM pages ORDER BY rowid"
+                    )
+                ],
+                [("a", 0), ("b", 0), ("Template:foo", 10), ("Module:baz", 828)],
+            )
+            self.assertEqual(
+                wtp.db_conn.execute("PRAGMA page_size").fetchone(), (16384,)
+            )
+            self.assertTrue(wtp.has_table("sqlite_stat1"))
+            self.assertTrue(wtp.has_table("pages_fts"))
+            self.assertEqual(
+                wtp.db_conn.execute("PRAGMA journal_mode").fetchone(), ("wal",)
+            )
+            self.assertEqual(
+                [
+                    page.title
+                    for page in wtp.get_all_pages(search_pattern="%{{foo%")
+                ],
+                ["b"],
+            )
+            self.assertEqual(wtp.get_page("a", 0).redirect_to, "b")
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path)
+            self.assertEqual(wtp.get_page("Module:baz", 828).body, "return {}")
+            self.assertTrue(wtp.page_exists("foo", 10))
+            wtp.close_db_conn()
+
+    def test_page_stores(self) -> None:
+        for backend in ("sqlite", "memory", "mmap"):
+            with self.subTest(backend=backend):
+                wtp = Wtp(page_store_backend=backend)
+                with wtp.bulk_load():
+                    wtp.add_page("Template:foo", 10, "{{bar}}", page_id=1)
+                    wtp.add_page("Template:Bar", 10, "bar")
+                    wtp.add_page("Template:baz", 10, redirect_to="Template:foo")
+                wtp.add_page("page", 0, "{{foo}} TEXT")
+                self.assertTrue(wtp.add_page("page", 0, "text", sha1="a"))
+                self.assertFalse(wtp.add_page("page", 0, "text", sha1="a"))
+                self.assertEqual(wtp.get_page_body("bar", 10), "bar")
+                self.assertEqual(wtp.get_page_by_id(1).title, "Template:foo")
+                self.assertEqual(wtp.saved_page_nums([10], False), 2)
+                self.assertEqual(
+                    [
+                        page.title
+                        for page in wtp.get_all_pages(search_pattern="%{{B_r}}")
+                    ],
+                    ["Template:foo"],
+                )
+                wtp.analyze_templates(
+                    lambda wtp, page: (
+                        {"Bar"} if page.body == "{{bar}}" else set(),
+                        page.title == "Template:Bar",
+                    )
+                )
+                self.assertTrue(wtp.get_page("baz", 10).need_pre_expand)
+                wtp.delete_page("Bar", 10)
+                self.assertIsNone(wtp.get_page("bar", 10))
+                self.assertTrue(wtp.has_pages())
+                wtp.close_db_conn()
+
+        with self.assertRaises(ValueError):
+            Wtp(page_store_backend="not_exist")
+
+    def test_get_all_pages_options(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path, body_compression="zlib")
+            for index in range(10):
+                wtp.add_page(f"page {index}", 0, f"text {index} " * 100)
+            wtp.export_page_pack()
+            wtp.close_db_conn()
+
+            for backend in ("sqlite", "memory", "pack"):
+                with self.subTest(backend=backend):
+                    if backend == "memory":
+                        wtp = Wtp(page_store_backend=backend)
+                        for index in range(10):
+                            wtp.add_page(f"page {index}", 0, f"text {index}")
+                    else:
+                        wtp = Wtp(db_path=db_path, page_store_backend=backend)
+                    pages = list(wtp.get_all_pages())
+                    self.assertEqual(
+                        [page.body for page in wtp.get_all_pages(body="skip")],
+                        [None] * 10,
+                    )
+                    lazy_pages = list(wtp.get_all_pages(body="lazy"))
+                    self.assertNotIn("body", lazy_pages[0].__dict__)
+                    self.assertEqual(lazy_pages[0].body, pages[0].body)
+                    self.assertEqual(
+                        pickle.loads(pickle.dumps(lazy_pages[1])), pages[1]
+                    )
+                    shards = [
+                        [
+                            page.title
+                            for page in wtp.get_all_pages(
+                                body="skip", shard=shard, num_shards=3
+                            )
+                        ]
+                        for shard in range(3)
+                    ]
+                    self.assertEqual(
+                        [len(titles) for titles in shards], [3, 3, 4]
+                    )
+                    self.assertEqual(
+                        sorted(sum(shards, [])),
+                        sorted(page.title for page in pages),
+                    )
+                    with self.assertRaises(ValueError):
+                        next(wtp.get_all_pages(shard=3, num_shards=3))
+                    wtp.close_db_conn()
+
+    def test_page_pack(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path, body_compression="zlib")
+            wtp.add_page("Template:foo", 10, "foo " * 100, page_id=2)
+            wtp.add_page("Template:bar", 10, redirect_to="Template:foo")
+            wtp.add_page("Template:Bar", 10, "Bar", need_pre_expand=True)
+            wtp.add_page("Module:baz", 828, "baz", model="Scribunto")
+            wtp.add_page("page", 0, "text", page_id=1)
+            pages = list(wtp.get_all_pages())
+            self.assertEqual(wtp.export_page_pack(), wtp.page_pack_path)
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path, page_store_backend="pack")
+            self.assertEqual(
+                sorted(wtp.get_all_pages(), key=lambda p: p.title),
+                sorted(pages, key=lambda p: p.title),
+            )
+            self.assertEqual(wtp.get_page_body("foo", 10), "foo " * 100)
+            self.assertEqual(
+                wtp.get_page("bar", 10).redirect_to, "Template:foo"
+            )
+            self.assertEqual(wtp.get_page("Bar", 10).body, "Bar")
+            self.assertEqual(
+                wtp.get_page("bar", 10, no_redirect=True).title, "Template:Bar"
+            )
+            self.assertEqual(wtp.get_page("Module:baz").model, "Scribunto")
+            self.assertIsNone(wtp.get_page("not exist", 0))
+            self.assertEqual(wtp.get_page_by_id(2).title, "Template:foo")
+            self.assertIsNone(wtp.get_page_by_id(3))
+            self.assertEqual(wtp.saved_page_nums([10], False), 2)
+            self.assertTrue(wtp.has_analyzed_templates())
+            with self.assertRaises(ValueError):
+                wtp.add_page("page", 0, "new text")
+            # the sandbox module is not saved when Lua starts
+            self.assertTrue(wtp.read_only)
+            add_empty_sandbox_lua_module(wtp)
+            self.assertIsNone(wtp.get_page("Module:_sandbox_phase1", 828))
+            wtp.close_db_conn()
+
+    def test_preload_namespaces(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            wtp.add_page("Template:foo", 10, "foo")
+            wtp.add_page("page", 0, "text")
+            wtp.close_db_conn()
+
+            wtp = Wtp(db_path=db_path, preload_namespaces=HOT_NAMESPACES)
+            queries = []
+            wtp.db_conn.set_trace_callback(queries.append)
+            self.assertEqual(wtp.get_page_body("foo", 10), "foo")
+            self.assertIsNone(wtp.get_page("bar", 10))
+            self.assertEqual(queries, [])
+            self.assertEqual(wtp.get_page_body("page", 0), "text")
+            self.assertEqual(len(queries), 1)
+            wtp.db_conn.set_trace_callback(None)
+            # changed pages are updated in memory
+            wtp.add_page("Template:bar", 10, "bar")
+            wtp.set_template_pre_expand("Template:foo")
+            self.assertEqual(wtp.get_page_body("bar", 10), "bar")
+            self.assertTrue(wtp.get_page("foo", 10).need_pre_expand)
+            wtp.delete_page("foo", 10)
+            self.assertIsNone(wtp.get_page("foo", 10))
+            with wtp.bulk_load():
+                wtp.add_page("Module:baz", 828, "baz", model="Scribunto")
+            self.assertEqual(wtp.get_page_body("baz", 828), "baz")
+            wtp.close_db_conn()
+
+    def test_preload_analyze_templates(self) -> None:
+        def check_template(wtp: Wtp, page: Page) -> tuple[set[str], bool]:
+            body = page.body or ""
+            return set(re.findall(r"{{([^{}|]+)", body)), "{|" in body
+
+        titles = ["table", "uses", "alias", "target", "plain"]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            wtp.add_page("Template:table", 10, "{|")
+            wtp.add_page("Template:uses", 10, "{{table}}")
+            wtp.add_page("Template:alias", 10, redirect_to="Template:table")
+            wtp.add_page("Template:target", 10, "{{alias}}")
+            wtp.add_page("Template:plain", 10, "plain")
+            wtp.close_db_conn()
+
+            results = []
+            for preload_namespaces in ((), HOT_NAMESPACES):
+                shutil.copy(db_path, Path(temp_dir) / "copy.db")
+                wtp = Wtp(
+                    db_path=Path(temp_dir) / "copy.db",
+                    preload_namespaces=preload_namespaces,
+                )
+                with patch.object(PreloadPageStore, "load_pages") as load:
+                    wtp.analyze_templates(check_template)
+                    first = [
+                        wtp.get_page(title, 10).need_pre_expand
+                        for title in titles
+                    ]
+                    wtp.add_page("Template:table", 10, "no table")
+                    wtp.analyze_templates(check_template, {"Template:table"})
+                    load.assert_not_called()
+                results.append(
+                    (
+                        first,
+                        [
+                            wtp.get_page(title, 10).need_pre_expand
+                            for title in titles
+                        ],
+                    )
+                )
+                wtp.close_db_conn()
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(
+                results[0],
+                (
+                    [True, True, True, False, False],
+                    [False, False, False, False, False],
+                ),
+            )
+
+    def test_search_index(self) -> None:
+        for body_compression in (None, "zlib"):
+            with self.subTest(body_compression=body_compression):
+                wtp = Wtp(body_compression=body_compression)
+                wtp.add_page("page 1", 0, "{{foo}} " * 100)
+                wtp.add_page("page 2", 0, "{{bar}}")
+                wtp.close_db_conn()
+                wtp = Wtp(
+                    db_path=wtp.db_path,
+                    body_compression=body_compression,
+                    search_index=True,
+                )
+                wtp.add_page("page 2", 0, "{{Foo}}")
+                wtp.add_page("page 3", 0, "{{foo}}")
+                wtp.delete_page("page 3", 0)
+                with wtp.bulk_load():
+                    wtp.add_page("page 4", 0, "text {{foo|bar}}")
+                    wtp.add_page("page 1", 0, "{{bar}}")
+                self.assertIn(
+                    "pages_fts",
+                    wtp.db_conn.execute(
+                        "EXPLAIN QUERY PLAN SELECT count(*) FROM pages"
+                        + wtp.page_store.build_sql_where_query(
+                            search_pattern="%{{foo%"
+                        )[0],
+                        ("%{{foo%",),
+                    ).fetchall()[-1][-1],
+                )
+                self.assertEqual(
+                    [
+                        page.title
+                        for page in wtp.get_all_pages(search_pattern="%{{foo%")
+                    ],
+                    ["page 2", "page 4"],
+                )
+                self.assertEqual(
+                    wtp.saved_page_nums(search_pattern="%bar}}"), 2
+                )
+                wtp.close_db_conn()
+
+    def test_body_compression(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path, body_compression="zlib")
+            long_text = "{{foo}} long text " * 100
+            wtp.add_page("long page", 0, long_text)
+            wtp.add_page("short page", 0, "short text")
+            with wtp.bulk_load():
+                wtp.add_page("Template:foo", 10, long_text)
+            self.assertEqual(
+                wtp.db_conn.execute(
+                    "SELECT typeof(body) FROM pages ORDER BY title"
+                ).fetchall(),
+                [("blob",), ("blob",), ("text",)],
+            )
+            self.assertEqual(wtp.get_page_body("long page", 0), long_text)
+            self.assertEqual(
+                [
+                    page.title
+                    for page in wtp.get_all_pages(search_pattern="%{{foo}}%")
+                ],
+                ["long page", "Template:foo"],
+            )
+            wtp.close_db_conn()
+
+            # use the codec saved in the database
+            wtp = Wtp(db_path=db_path)
+            self.assertEqual(wtp.body_compression, "zlib")
+            self.assertEqual(wtp.get_page_body("Template:foo", 10), long_text)
+            self.assertEqual(wtp.get_page_body("short page", 0), "short text")
+            wtp.close_db_conn()
+
+    def test_read_only(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            wtp.add_page("page", 0, "text")
+            wtp.close_db_conn()
+
+            for keep_writer_open in (False, True):
+                with self.subTest(keep_writer_open=keep_writer_open):
+                    if keep_writer_open:
+                        writer = Wtp(db_path=db_path)
+                        writer.add_page("new page", 0, "new text")
+                        writer.db_conn.commit()
+                    wtp = Wtp(db_path=db_path, read_only=True)
+                    self.assertEqual(wtp.get_page_body("page", 0), "text")
+                    if keep_writer_open:
+                        # committed WAL data is read
+                        self.assertEqual(
+                            wtp.get_page_body("new page", 0), "new text"
+                        )
+                        writer.close_db_conn()
+                    self.assertEqual(
+                        wtp.db_conn.execute("PRAGMA query_only").fetchone(),
+                        (1,),
+                    )
+                    self.assertEqual(wtp.page_store_backend, "mmap")
+                    with self.assertRaises(sqlite3.OperationalError):
+                        wtp.add_page("page", 0, "new text")
+                    wtp.close_db_conn()
+            self.assertTrue(db_path.exists())
+
+        with self.assertRaises(ValueError):
+            Wtp(db_path="not_exist.db", read_only=True)
@@ -1,14 +1,90 @@
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import re
+import shutil
+import subprocess
+import tempfile
 import unittest
 from collections import namedtuple
+from contextlib import nullcontext
 from pathlib import Path
 from unittest.mock import patch
 
-from wikitextprocessor import Wtp
+from wikitextprocessor import Page, Wtp
 from wikitextprocessor.dumpparser import (
+    MAX_PENDING_RANGES_PER_PROCESS,
+    DumpStats,
+    decompress_dump_file,
+    get_dump_checkpoint,
+    iter_multistream_dump_pages,
+    iter_page_xmls,
+    overwrite_pages,
+    parse_dump_xml,
+    parse_multistream_dump_xml,
     path_is_on_windows_partition,
     process_dump,
+    process_incremental_dump,
+    save_pages_to_file,
 )
 
+TEST_DUMP_PATH = "tests/test-pages-articles.xml.bz2"
+TEST_NAMESPACE_IDS = {0, 4, 10, 14, 100, 110, 118, 828}
+
+
+def create_multistream_dump(folder: Path, pages_per_stream: int) -> Path:
+    """Convert the test dump file to the multistream format, returns the
+    path of the created index file."""
+    with bz2.open(TEST_DUMP_PATH, "rt", encoding="utf-8") as f:
+        xml = f.read()
+    first_page = xml.index("  <page>")
+    footer = xml.rindex("</mediawiki>")
+    pages = re.findall(r"(?s)  <page>.*?</page>\n", xml[first_page:footer])
+    dump_path = folder / "test-pages-articles-multistream.xml.bz2"
+    index_path = folder / "test-pages-articles-multistream-index.txt.bz2"
+    with (
+        dump_path.open("wb") as dump_file,
+        bz2.open(index_path, "wt", encoding="utf-8") as index_file,
+    ):
+        dump_file.write(bz2.compress(xml[:first_page].encode()))
+        for index in range(0, len(pages), pages_per_stream):
+            offset = dump_file.tell()
+            stream_pages = pages[index : index + pages_per_stream]
+            for page in stream_pages:
+                page_id = re.search(r"<id>(\d+)</id>", page).group(1)
+                title = re.search(r"<title>(.*?)</title>", page).group(1)
+                index_file.write(f"{offset}:{page_id}:{title}\n")
+            dump_file.write(bz2.compress("".join(stream_pages).encode()))
+        dump_file.write(bz2.compress(xml[footer:].encode()))
+    return index_path
+
+
+def dump_xml(pages: list[tuple[str, int, str]]) -> str:
+    xml = '<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">\n'
+    for page_id, (title, namespace_id, text) in enumerate(pages, 1):
+        xml += f"""  <page>
+    <title>{title}</title>
+    <ns>{namespace_id}</ns>
+    <id>{page_id}</id>
+    <revision>
+      <id>{page_id * 10}</id>
+      <model>wikitext</model>
+      <format>text/x-wiki</format>
+      <text xml:space="preserve">{text}</text>
+      <sha1>{hashlib.sha1(text.encode()).hexdigest()}</sha1>
+    </revision>
+  </page>
+"""
+    return xml + "</mediawiki>\n"
+
+
+def check_template(wtp: Wtp, page: Page) -> tuple[set[str], bool]:
+    body = page.body or ""
+    return set(re.findall(r"{{([^{}|]+)", body)), "{|" in body
+
+
 sdisktype = namedtuple("sdisktype", "fstype mountpoint")
 
 
@@ -49,7 +125,384 @@ class DumpParserTests(unittest.TestCase):
     def test_process_dump(self):
         process_dump(
             self.wtp,
-            "tests/test-pages-articles.xml.bz2",
-            {0, 4, 10, 14, 100, 110, 118, 828},
+            TEST_DUMP_PATH,
+            TEST_NAMESPACE_IDS,
         )
         self.assertGreater(self.wtp.saved_page_nums(), 0)
+
+    @patch("wikitextprocessor.dumpparser.init_interwiki_map")
+    def test_process_dump_saved_metadata(self, _):
+        for bulk_load in (False, True):
+            with (
+                self.subTest(bulk_load=bulk_load),
+                tempfile.TemporaryDirectory() as temp_dir,
+            ):
+                db_path = Path(temp_dir) / "pages.db"
+                wtp = Wtp(db_path=db_path)
+                process_dump(
+                    wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS, bulk_load=bulk_load
+                )
+                read_only_wtp = Wtp(db_path=db_path, read_only=True)
+                self.assertIsNotNone(read_only_wtp.title_filter)
+                self.assertTrue(
+                    read_only_wtp.title_filter.may_contain("Template:!", 10)
+                )
+                self.assertIsNotNone(read_only_wtp.get_page("Template:!", 10))
+                self.assertEqual(
+                    read_only_wtp.site_stats.pages,
+                    read_only_wtp.saved_page_nums(),
+                )
+                self.assertTrue(read_only_wtp.redirects_resolved)
+                read_only_wtp.close_db_conn()
+                wtp.close_db_conn()
+
+    def test_parse_multistream_dump(self):
+        parse_dump_xml(self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = create_multistream_dump(Path(temp_dir), 7)
+            multistream_wtp = Wtp()
+            parse_multistream_dump_xml(
+                multistream_wtp,
+                str(index_path).replace("-index.txt", ".xml"),
+                str(index_path),
+                TEST_NAMESPACE_IDS,
+                num_processes=2,
+                streams_per_range=3,
+            )
+        self.assertEqual(
+            sorted(multistream_wtp.get_all_pages(), key=lambda p: p.title),
+            sorted(self.wtp.get_all_pages(), key=lambda p: p.title),
+        )
+        self.assertGreater(multistream_wtp.saved_page_nums(), 0)
+        multistream_wtp.close_db_conn()
+
+    def test_multistream_pending_ranges(self):
+        from multiprocessing.pool import Pool
+
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            patch.object(
+                Pool,
+                "apply_async",
+                autospec=True,
+                side_effect=Pool.apply_async,
+            ) as apply_async,
+        ):
+            index_path = create_multistream_dump(Path(temp_dir), 1)
+            pages = iter_multistream_dump_pages(
+                str(index_path).replace("-index.txt", ".xml"),
+                str(index_path),
+                TEST_NAMESPACE_IDS,
+                num_processes=2,
+                streams_per_range=1,
+            )
+            # only a few ranges are parsed when pages are not used, the next
+            # range is started after the first result is received
+            next(pages)
+            self.assertEqual(
+                apply_async.call_count, 2 * MAX_PENDING_RANGES_PER_PROCESS + 1
+            )
+            list(pages)
+        self.assertGreater(apply_async.call_count, 10)
+
+    def test_decompress_dump_file_formats(self):
+        with bz2.open(TEST_DUMP_PATH) as f:
+            xml = f.read()
+        parse_dump_xml(self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS)
+        page_nums = self.wtp.saved_page_nums()
+        dump_files = {
+            ".gz": gzip.compress(xml),
+            ".xz": lzma.compress(xml),
+            ".xml": xml,
+        }
+        if shutil.which("zstd") is not None:
+            dump_files[".zst"] = subprocess.run(
+                ["zstd", "-c"], input=xml, capture_output=True, check=True
+            ).stdout
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for suffix, data in dump_files.items():
+                dump_path = Path(temp_dir) / f"test-pages-articles{suffix}"
+                dump_path.write_bytes(data)
+                with self.subTest(suffix=suffix):
+                    self.assertEqual(
+                        self.count_dump_pages(dump_path), page_nums
+                    )
+                if suffix == ".zst":
+                    continue
+                with (
+                    self.subTest(suffix=suffix, command=None),
+                    patch("shutil.which", return_value=None),
+                ):
+                    self.assertEqual(
+                        self.count_dump_pages(dump_path), page_nums
+                    )
+
+    def count_dump_pages(self, dump_path: Path) -> int:
+        wtp = Wtp()
+        parse_dump_xml(wtp, str(dump_path), TEST_NAMESPACE_IDS)
+        page_nums = wtp.saved_page_nums()
+        wtp.close_db_conn()
+        return page_nums
+
+    def test_decompress_dump_file_stdin(self):
+        with bz2.open(TEST_DUMP_PATH) as f:
+            stdin = io.TextIOWrapper(io.BytesIO(f.read()))
+        with patch("sys.stdin", stdin):
+            self.assertIs(decompress_dump_file("-"), stdin.buffer)
+            parse_dump_xml(self.wtp, "-", TEST_NAMESPACE_IDS)
+        self.assertGreater(self.wtp.saved_page_nums(), 0)
+
+    def test_decompress_dump_file_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            decompress_dump_file("dump.7z")
+
+    def test_process_incremental_dump(self):
+        for title, body in [
+            ("A", "{{B}}"),
+            ("B", "{{C}}"),
+            ("C", "text"),
+            ("D", "{|"),
+            ("E", "{{D}}"),
+            ("F", "{|"),
+            ("G", "{{F}}"),
+            ("H", "{{F}}{{C}}"),
+        ]:
+            self.wtp.add_page(f"Template:{title}", 10, body)
+        self.wtp.add_page("Template:I", 10, redirect_to="Template:C")
+        self.wtp.analyze_templates(check_template)
+        analyzed_titles = []
+
+        def check_changed_template(wtp: Wtp, page: Page):
+            analyzed_titles.append(page.title)
+            return check_template(wtp, page)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dump_path = Path(temp_dir) / "adds-changes.xml"
+            dump_path.write_text(
+                dump_xml([("Template:C", 10, "{|"), ("word", 0, "{{C}}")])
+            )
+            changed_titles = process_incremental_dump(
+                self.wtp,
+                str(dump_path),
+                {0, 10},
+                deleted_titles=["Template:D"],
+                analyze_template_func=check_changed_template,
+            )
+        self.assertEqual(changed_titles, {"Template:C", "Template:D", "word"})
+        self.assertEqual(
+            sorted(analyzed_titles),
+            ["Template:A", "Template:B", "Template:C", "Template:E"]
+            + ["Template:H"],
+        )
+        self.assertIsNone(self.wtp.get_page("Template:D", 10))
+        self.assertEqual(self.wtp.get_page_body("word", 0), "{{C}}")
+        for title, need_pre_expand in [
+            ("A", True),
+            ("B", True),
+            ("C", True),
+            ("E", False),
+            ("F", True),
+            ("G", True),
+            ("H", True),
+            ("I", True),
+        ]:
+            with self.subTest(title=title):
+                self.assertEqual(
+                    self.wtp.get_page(title, 10).need_pre_expand,
+                    need_pre_expand,
+                )
+
+    def test_skip_unchanged_pages(self):
+        self.assertIsNone(
+            parse_dump_xml(self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS)
+        )
+        self.assertEqual(
+            self.wtp.db_conn.execute(
+                "SELECT revision_id, sha1 FROM pages WHERE title = 'dictionary'"
+            ).fetchone(),
+            (50220873, "8k2qhgfi0qznqi338pwbsjplmt3nmud"),
+        )
+        self.assertEqual(
+            parse_dump_xml(self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS),
+            set(),
+        )
+        self.assertEqual(self.wtp.get_page("dictionary", 0).page_id, 16)
+        self.assertEqual(self.wtp.get_page_by_id(16).title, "dictionary")
+        with self.wtp.bulk_load():
+            self.assertEqual(
+                parse_dump_xml(self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS),
+                set(),
+            )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dump_path = Path(temp_dir) / "pages.xml"
+            dump_path.write_text(
+                dump_xml([("dictionary", 0, "new text"), ("new page", 0, "")])
+            )
+            with self.wtp.bulk_load():
+                self.assertEqual(
+                    parse_dump_xml(self.wtp, str(dump_path), {0}),
+                    {"dictionary", "new page"},
+                )
+            self.assertEqual(
+                parse_dump_xml(self.wtp, str(dump_path), {0}), set()
+            )
+        self.assertEqual(self.wtp.get_page_body("dictionary", 0), "new text")
+
+    def test_empty_sha1(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dump_path = Path(temp_dir) / "pages.xml"
+            for text, changed_titles in (
+                ("old text", None),
+                ("new text", {"word"}),
+            ):
+                dump_path.write_text(
+                    re.sub(
+                        r"<sha1>\w+</sha1>",
+                        "<sha1/>",
+                        dump_xml([("word", 0, text)]),
+                    )
+                )
+                self.assertEqual(
+                    parse_dump_xml(self.wtp, str(dump_path), {0}),
+                    changed_titles,
+                )
+        self.assertEqual(self.wtp.get_page_body("word", 0), "new text")
+        self.assertIsNone(self.wtp.page_store.get_sha1("word", 0))
+
+    def test_dump_stats(self):
+        with bz2.open(TEST_DUMP_PATH) as f:
+            xml_size = len(f.read())
+        stats = DumpStats()
+        with stats.timer("extract_dump"):
+            parse_dump_xml(
+                self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS, stats=stats
+            )
+        stats_dict = stats.to_dict()
+        self.assertEqual(stats_dict["pages"], self.wtp.saved_page_nums())
+        self.assertEqual(stats_dict["decompressed_bytes"], xml_size)
+        self.assertEqual(
+            stats_dict["compressed_bytes"], Path(TEST_DUMP_PATH).stat().st_size
+        )
+        for stage in ("decompression", "xml_parsing", "save_pages"):
+            with self.subTest(stage=stage):
+                self.assertGreater(stats_dict["seconds"][stage], 0)
+        self.assertGreater(stats_dict["pages_per_second"], 0)
+
+    def test_save_pages_to_tar_file(self):
+        self.wtp.add_page("word", 0, "text")
+        self.wtp.add_page("Template:foo", 10, "{{bar}}")
+        self.wtp.add_page("Module:foo", 828, "return {}")
+        self.wtp.db_conn.commit()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for file_name in ("pages.tar", "pages.tar.gz", "pages.tar.xz"):
+                for which in (shutil.which, lambda command: None):
+                    tar_path = Path(temp_dir) / file_name
+                    with (
+                        self.subTest(file_name=file_name, which=which),
+                        patch("shutil.which", which),
+                    ):
+                        save_pages_to_file(self.wtp, tar_path)
+                        wtp = Wtp()
+                        wtp.add_page("Module:foo", 828, "")
+                        self.assertTrue(overwrite_pages(wtp, [tar_path], False))
+                        self.assertFalse(overwrite_pages(wtp, [tar_path], True))
+                        self.assertEqual(wtp.get_page_body("word", 0), "text")
+                        self.assertEqual(
+                            wtp.get_page_body("Module:foo", 828), "return {}"
+                        )
+                        wtp.close_db_conn()
+
+    @patch("wikitextprocessor.dumpparser.DUMP_CHECKPOINT_INTERVAL", 100)
+    def test_resume_parse_dump_xml(self):
+        add_page = Wtp.add_page
+        parse_dump_xml(self.wtp, TEST_DUMP_PATH, TEST_NAMESPACE_IDS)
+        expected_pages = sorted(self.wtp.get_all_pages(), key=lambda p: p.title)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = create_multistream_dump(Path(temp_dir), 7)
+            for dump_path, index, bulk_load in [
+                (TEST_DUMP_PATH, None, False),
+                (TEST_DUMP_PATH, None, True),
+                (
+                    str(index_path).replace("-index.txt", ".xml"),
+                    index_path,
+                    True,
+                ),
+            ]:
+                with self.subTest(index=index, bulk_load=bulk_load):
+                    wtp = Wtp(db_path=Path(temp_dir) / "pages.db")
+                    page_nums = 0
+
+                    def interrupted_add_page(*args, **kwargs):
+                        nonlocal page_nums
+                        page_nums += 1
+                        if page_nums > 1000:
+                            raise KeyboardInterrupt
+                        return add_page(*args, **kwargs)
+
+                    with (
+                        self.assertRaises(KeyboardInterrupt),
+                        patch.object(Wtp, "add_page", interrupted_add_page),
+                    ):
+                        with (
+                            wtp.bulk_load(resumable=True)
+                            if bulk_load
+                            else nullcontext()
+                        ):
+                            parse_dump_xml(
+                                wtp,
+                                dump_path,
+                                TEST_NAMESPACE_IDS,
+                                str(index) if index else None,
+                                num_processes=2,
+                                resumable=True,
+                            )
+                    checkpoint = get_dump_checkpoint(wtp, dump_path)
+                    self.assertIsNotNone(checkpoint.page_id)
+                    self.assertEqual(
+                        checkpoint.byte_offset is None, index is None
+                    )
+                    with (
+                        wtp.bulk_load(resumable=True)
+                        if bulk_load
+                        else nullcontext()
+                    ):
+                        parse_dump_xml(
+                            wtp,
+                            dump_path,
+                            TEST_NAMESPACE_IDS,
+                            str(index) if index else None,
+                            num_processes=2,
+                            resumable=True,
+                        )
+                    self.assertIsNone(
+                        get_dump_checkpoint(wtp, dump_path).page_id
+                    )
+                    self.assertTrue(
+                        sorted(wtp.get_all_pages(), key=lambda p: p.title)
+                        == expected_pages
+                    )
+                    wtp.close_db_conn()
+                    (Path(temp_dir) / "pages.db").unlink()
+
+    def test_iter_page_xmls(self):
+        xml = dump_xml(
+            [
+                ("page", 0, "&lt;/page&gt; text"),
+                ("Template:foo", 10, "{{bar}}"),
+                ("Talk:page", 1, "talk " * 100),
+                ("Module:foo", 828, "return {}"),
+            ]
+        ).encode()
+        for chunk_size in (1, 5, 64, 1 << 20):
+            with self.subTest(chunk_size=chunk_size):
+                page_xmls = list(
+                    iter_page_xmls(io.BytesIO(xml), {10, 828}, chunk_size)
+                )
+                self.assertEqual(len(page_xmls), 2)
+                self.assertTrue(
+                    page_xmls[0].startswith(b"<page>\n    <title>Template:")
+                )
+                self.assertTrue(
+                    page_xmls[1].startswith(b"<page>\n    <title>Module:")
+                )
+                self.assertTrue(page_xmls[1].endswith(b"</page>"))
@@ -655,3 +655,31 @@ end
 return export""",
         )
         self.assertEqual(self.wtp.expand("{{#invoke:test|test}}"), "Wiktionary")
+
+    def test_invoke_page_pack(self):
+        import tempfile
+        from pathlib import Path
+
+        from wikitextprocessor import Wtp
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = Path(temp_dir) / "pages.db"
+            wtp = Wtp(db_path=db_path)
+            wtp.add_page(
+                "Module:test",
+                828,
+                """local export = {}
+function export.test(frame)
+  return "pack"
+end
+return export""",
+                model="Scribunto",
+            )
+            wtp.export_page_pack()
+            wtp.close_db_conn()
+
+            # the page pack store can't save the sandbox module
+            wtp = Wtp(db_path=db_path, page_store_backend="pack")
+            wtp.start_page("")
+            self.assertEqual(wtp.expand("{{#invoke:test|test}}"), "pack")
+            wtp.close_db_conn()
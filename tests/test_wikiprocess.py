@@ -3865,6 +3865,17 @@ return export
         return mw.title.getCurrentTitle().text""",
         )
 
+    def test_mw_title_id(self):
+        self.ctx.add_page("Foo", 0, "text", page_id=42)
+        self.ctx.add_page("Bar", 0, "text")
+        self.scribunto(
+            "42 0 0 Foo nil",
+            """
+        return mw.title.new("Foo").id .. " " .. mw.title.new("Bar").id
+        .. " " .. mw.title.new("Baz").id .. " " .. mw.title.new(42).text
+        .. " " .. tostring(mw.title.new(43))""",
+        )
+
     def test_mw_title59(self):
         # Turns out some modules save information betweem calls - at least
         # page title.  Thus it is necessary to reload modules for each page.